@@ -1,31 +1,44 @@
 import azure.functions as func
-import json
-from cosmos_client import get_container
+from cosmos_common import USE_ASYNC
+from product_validation import validate_product
+from responses import json_response
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+def _parse(req):
+    """Returns (product, error response)."""
     try:
         body = req.get_json()
     except:
-        return func.HttpResponse("Invalid JSON", status_code=400)
+        return None, func.HttpResponse("Invalid JSON", status_code=400)
 
-    if not body or "id" not in body or not str(body.get("id")).strip():
-        return func.HttpResponse("Missing 'id' in body", status_code=400)
+    if not body:
+        return None, func.HttpResponse("Missing 'id' in body", status_code=400)
 
-    if "price" not in body:
-        return func.HttpResponse("Missing 'price' in body", status_code=400)
+    body, error = validate_product(body)
+    if error:
+        return None, func.HttpResponse(error, status_code=400)
+    return body, None
 
-    try:
-        price = float(body["price"])
-    except (ValueError, TypeError):
-        return func.HttpResponse("Invalid 'price' value; must be numeric", status_code=400)
+def _response(req, created):
+    return json_response(req, created, status_code=201, headers={"ETag": created.get("_etag", "")})
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
+    body, error = _parse(req)
+    if error:
+        return error
+
+    return _response(req, store.create_item(body))
 
-    body["price"] = price
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    body, error = _parse(req)
+    if error:
+        return error
 
-    container = get_container()
-    created = container.create_item(body)
+    return _response(req, await store.create_item(body))
 
-    return func.HttpResponse(
-        json.dumps(created),
-        mimetype="application/json",
-        status_code=201
-    )
\ No newline at end of file
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
@@ -0,0 +1,98 @@
+import azure.functions as func
+import json
+import os
+from cosmos_common import USE_ASYNC
+from product_validation import validate_product
+from responses import json_response
+
+# Same store as the other handlers, so the bulk writes invalidate the cache they read from
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "10000"))
+
+def _ndjson_rows(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def parse_rows(req):
+    """Accept a JSON array or NDJSON (one product per line)."""
+    text = req.get_body().decode("utf-8")
+    content_type = req.headers.get("Content-Type", "")
+    if "ndjson" in content_type:
+        return _ndjson_rows(text)
+    try:
+        rows = json.loads(text)
+    except ValueError:
+        # Several JSON values: NDJSON sent without its content type
+        return _ndjson_rows(text)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array (or NDJSON with Content-Type: application/x-ndjson)")
+    return rows
+
+def _validate(req):
+    """Returns (rows, valid products, their row indexes, per-row results) or an error response."""
+    try:
+        rows = parse_rows(req)
+    except (ValueError, UnicodeDecodeError) as e:
+        return None, func.HttpResponse(f"Invalid body: {e}", status_code=400)
+
+    if not rows:
+        return None, func.HttpResponse("No products in body", status_code=400)
+    if len(rows) > BULK_MAX_ROWS:
+        return None, func.HttpResponse(f"At most {BULK_MAX_ROWS} products per request", status_code=413)
+
+    # Validate with the same rules as AddProduct; only valid rows are written
+    results = [None] * len(rows)
+    valid_rows = []
+    valid_index = []
+    seen_ids = set()
+    for i, row in enumerate(rows):
+        product, error = validate_product(row)
+        if not error and str(product["id"]) in seen_ids:
+            error = "Duplicate 'id' in request"
+        if error:
+            results[i] = {"index": i, "id": row.get("id") if isinstance(row, dict) else None,
+                          "status": 400, "error": error}
+            continue
+        product["id"] = str(product["id"])
+        seen_ids.add(product["id"])
+        valid_rows.append(product)
+        valid_index.append(i)
+    return (rows, valid_rows, valid_index, results), None
+
+def _response(req, rows, valid_index, results, written):
+    for i, result in zip(valid_index, written):
+        results[i] = dict(result, index=i)
+
+    succeeded = sum(1 for r in results if r["status"] < 300)
+    summary = {
+        "total": len(rows),
+        "succeeded": succeeded,
+        "failed": len(rows) - succeeded,
+        "results": results
+    }
+
+    return json_response(req, summary, status_code=200 if succeeded == len(rows) else 207)
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
+    parsed, error = _validate(req)
+    if error:
+        return error
+    rows, valid_rows, valid_index, results = parsed
+
+    written = store.bulk_write(valid_rows, upsert=req.params.get("mode") == "upsert")
+    return _response(req, rows, valid_index, results, written)
+
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    parsed, error = _validate(req)
+    if error:
+        return error
+    rows, valid_rows, valid_index, results = parsed
+
+    written = await store.bulk_write(valid_rows, upsert=req.params.get("mode") == "upsert")
+    return _response(req, rows, valid_index, results, written)
+
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
@@ -1,15 +1,34 @@
 # python
 import azure.functions as func
-from cosmos_client import delete_item
+from cosmos_common import USE_ASYNC
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
     # accept id from route or query string
     id = req.route_params.get('id') or req.params.get('id')
     if not id:
         return func.HttpResponse("id required", status_code=400)
 
     try:
-        item = delete_item(id)
+        store.delete_item(id)
+        return func.HttpResponse(f"Item with id {id} deleted", status_code=200)
+    except Exception as e:
+        return func.HttpResponse(f"Error deleting item: {e}", status_code=500)
+
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    id = req.route_params.get('id') or req.params.get('id')
+    if not id:
+        return func.HttpResponse("id required", status_code=400)
+
+    try:
+        await store.delete_item(id)
         return func.HttpResponse(f"Item with id {id} deleted", status_code=200)
     except Exception as e:
-        return func.HttpResponse(f"Error deleting item: {e}", status_code=500)
\ No newline at end of file
+        return func.HttpResponse(f"Error deleting item: {e}", status_code=500)
+
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
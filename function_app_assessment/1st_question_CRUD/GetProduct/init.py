@@ -1,18 +1,32 @@
 import azure.functions as func
-import json
-from cosmos_client import read_item
+from cosmos_common import USE_ASYNC
+from responses import json_response
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+def _response(req, item):
+    if not item:
+        return func.HttpResponse("Not found", status_code=404)
+
+    # The document's _etag doubles as the HTTP ETag, so If-None-Match gets a 304
+    return json_response(req, item, etag=item.get("_etag"))
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
     id = req.route_params.get('id')
     if not id:
         return func.HttpResponse("id required", status_code=400)
 
-    item = read_item(id)
-    if not item:
-        return func.HttpResponse("Not found", status_code=404)
+    return _response(req, store.read_item(id))
+
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    id = req.route_params.get('id')
+    if not id:
+        return func.HttpResponse("id required", status_code=400)
+
+    return _response(req, await store.read_item(id))
 
-    return func.HttpResponse(
-        json.dumps(item),
-        mimetype="application/json",
-        status_code=200
-    )
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
@@ -1,15 +1,66 @@
 import azure.functions as func
-import json
-from cosmos_client import get_container
-
-def main(req: func.HttpRequest) -> func.HttpResponse:
-    container = get_container()
-    items = list(container.query_items(
-        query="SELECT * FROM c",
-        enable_cross_partition_query=True
-    ))
-
-    return func.HttpResponse(
-        json.dumps(items),
-        mimetype="application/json"
-    )
+from cosmos_common import USE_ASYNC
+from product_query import parse_fields, parse_filters, build_query, encode_continuation, decode_continuation
+from responses import encode_json, encoded_response, body_etag, json_response
+
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def _parse(req):
+    """Returns (limit, query, parameters, continuation, error response)."""
+    try:
+        limit = int(req.params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        return None, None, None, None, func.HttpResponse("Invalid 'limit'; must be an integer", status_code=400)
+    if limit < 1 or limit > MAX_LIMIT:
+        return None, None, None, None, func.HttpResponse(f"'limit' must be between 1 and {MAX_LIMIT}", status_code=400)
+
+    try:
+        fields = parse_fields(req.params.get("fields"))
+        filters = parse_filters(req.params)
+        continuation = decode_continuation(req.params.get("continuation"))
+    except ValueError as e:
+        return None, None, None, None, func.HttpResponse(str(e), status_code=400)
+
+    query, parameters = build_query(fields, **filters)
+    return limit, query, parameters, continuation, None
+
+def _ndjson_response(req, items, next_token):
+    # Same paging as JSON mode; the next page's token travels in a header
+    body = b"".join(encode_json(item) + b"\n" for item in items)
+    token = encode_continuation(next_token)
+    headers = {"X-Continuation": token} if token else None
+    return encoded_response(req, body, mimetype="application/x-ndjson", etag=body_etag(body), headers=headers)
+
+def _page_response(req, items, next_token):
+    # Weak ETag over the page body: a repeat read of an unchanged page gets a 304
+    payload = {"items": items, "continuation": encode_continuation(next_token)}
+    return json_response(req, payload, compute_etag=True)
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
+    limit, query, parameters, continuation, error = _parse(req)
+    if error:
+        return error
+
+    page = store.query_page(query, parameters, limit=limit, continuation=continuation)
+    if req.params.get("format") == "ndjson":
+        return _ndjson_response(req, *page)
+    return _page_response(req, *page)
+
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    limit, query, parameters, continuation, error = _parse(req)
+    if error:
+        return error
+
+    page = await store.query_page(query, parameters, limit=limit, continuation=continuation)
+    if req.params.get("format") == "ndjson":
+        return _ndjson_response(req, *page)
+    return _page_response(req, *page)
+
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
@@ -0,0 +1,19 @@
+import logging
+import azure.functions as func
+from cosmos_common import USE_ASYNC
+
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+# Runs once when a new instance is added, before it receives traffic
+def main_sync(warmupContext: func.Context) -> None:
+    timings = store.warmup()
+    logging.info(f"Warmup complete: {timings}")
+
+async def main_async(warmupContext: func.Context) -> None:
+    timings = await store.warmup()
+    logging.info(f"Warmup complete: {timings}")
+
+main = main_async if USE_ASYNC else main_sync
@@ -0,0 +1,173 @@
+"""Load-test the CRUD handlers against the in-memory Cosmos stand-in.
+
+Each iteration drives one product through AddProduct -> GetProduct ->
+ListProducts -> updateProduct -> DelProduct, with `--concurrency` iterations
+in flight. Reports throughput and p50/p95/p99 latency per handler.
+
+    python bench/crud_benchmark.py --iterations 2000 --concurrency 32 --latency-ms 5
+    python bench/crud_benchmark.py --mode async --throttle-rate 0.02 --json results.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDLERS = ["AddProduct", "GetProduct", "ListProducts", "updateProduct", "DelProduct"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="injected latency per Cosmos call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probability of a 429 per Cosmos call")
+    parser.add_argument("--seed-products", type=int, default=500, help="products created before the run")
+    parser.add_argument("--list-limit", type=int, default=50)
+    parser.add_argument("--json", help="write the report to this file as JSON")
+    return parser.parse_args()
+
+
+def configure_env(args):
+    # Must happen before the handlers (and cosmos_client) are imported
+    os.environ["COSMOS_CONN_STRING"] = "memory://"
+    os.environ["COSMOS_CLIENT_MODE"] = args.mode
+    os.environ["FAKE_COSMOS_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_COSMOS_THROTTLE_RATE"] = str(args.throttle_rate)
+    os.environ.setdefault("COSMOS_METRICS_LOG_INTERVAL", "0")
+    sys.path.insert(0, APP_DIR)
+
+
+def load_handlers():
+    handlers = {}
+    for name in HANDLERS:
+        spec = importlib.util.spec_from_file_location(f"bench_{name}", os.path.join(APP_DIR, name, "init.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        handlers[name] = module.main
+    return handlers
+
+
+def build_requests(i, list_limit):
+    import azure.functions as func
+    id = f"bench-{i}"
+    product = {"id": id, "name": f"Product {i}", "category": f"cat-{i % 10}", "price": i % 500 + 0.99}
+    return [
+        ("AddProduct", 201, func.HttpRequest("POST", "/api/addproduct", body=json.dumps(product).encode())),
+        ("GetProduct", 200, func.HttpRequest("GET", f"/api/products/{id}", route_params={"id": id}, body=b"")),
+        ("ListProducts", 200, func.HttpRequest("GET", "/api/products", params={"limit": str(list_limit)}, body=b"")),
+        ("updateProduct", 200, func.HttpRequest("PUT", f"/api/products/{id}", route_params={"id": id},
+                                                body=json.dumps({"price": 9.99}).encode())),
+        ("DelProduct", 200, func.HttpRequest("DELETE", f"/api/products/{id}", route_params={"id": id}, body=b"")),
+    ]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def summarize(samples, elapsed):
+    report = {"elapsedSeconds": round(elapsed, 3), "handlers": {}}
+    total = 0
+    for name in HANDLERS:
+        latencies = sorted(ms for ms, ok in samples[name])
+        errors = sum(1 for ms, ok in samples[name] if not ok)
+        total += len(latencies)
+        report["handlers"][name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "p50Ms": round(percentile(latencies, 0.50), 2),
+            "p95Ms": round(percentile(latencies, 0.95), 2),
+            "p99Ms": round(percentile(latencies, 0.99), 2),
+        }
+    report["requests"] = total
+    report["requestsPerSecond"] = round(total / elapsed, 1) if elapsed else None
+    return report
+
+
+def seed_products(count):
+    return [{"id": f"seed-{i}", "name": f"Seed {i}", "price": float(i)} for i in range(count)]
+
+
+def run_sync(handlers, args):
+    samples = {name: [] for name in HANDLERS}
+
+    def iteration(i):
+        for name, expected, req in build_requests(i, args.list_limit):
+            start = time.perf_counter()
+            try:
+                ok = handlers[name](req).status_code == expected
+            except Exception:
+                ok = False
+            samples[name].append(((time.perf_counter() - start) * 1000, ok))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(iteration, range(args.iterations)))
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def run_async(handlers, args):
+    samples = {name: [] for name in HANDLERS}
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def iteration(i):
+        async with limit:
+            for name, expected, req in build_requests(i, args.list_limit):
+                start = time.perf_counter()
+                try:
+                    ok = (await handlers[name](req)).status_code == expected
+                except Exception:
+                    ok = False
+                samples[name].append(((time.perf_counter() - start) * 1000, ok))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(iteration(i) for i in range(args.iterations)))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def print_report(report, args):
+    print(f"mode={args.mode} iterations={args.iterations} concurrency={args.concurrency} "
+          f"latency_ms={args.latency_ms} throttle_rate={args.throttle_rate}")
+    print(f"{'handler':<15}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, h in report["handlers"].items():
+        print(f"{name:<15}{h['requests']:>10}{h['errors']:>8}{h['p50Ms']:>10}{h['p95Ms']:>10}{h['p99Ms']:>10}")
+    print(f"throughput: {report['requestsPerSecond']} req/s over {report['elapsedSeconds']} s")
+
+
+def main():
+    args = parse_args()
+    configure_env(args)
+    handlers = load_handlers()
+
+    if args.mode == "async":
+        import cosmos_client_aio
+
+        async def run():
+            await cosmos_client_aio.warmup()
+            await asyncio.gather(*(cosmos_client_aio.create_item(p) for p in seed_products(args.seed_products)))
+            return await run_async(handlers, args)
+        report = asyncio.run(run())
+        report["cosmos"] = cosmos_client_aio.metrics_snapshot()
+    else:
+        import cosmos_client
+        cosmos_client.warmup()
+        cosmos_client.bulk_write(seed_products(args.seed_products), upsert=True)
+        report = run_sync(handlers, args)
+        report["cosmos"] = cosmos_client.metrics_snapshot()
+
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
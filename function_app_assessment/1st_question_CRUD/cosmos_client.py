@@ -1,47 +1,249 @@
+import logging
 import os
-from azure.cosmos import CosmosClient, PartitionKey
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.cosmos import CosmosClient, PartitionKey, exceptions
+from cosmos_common import (
+    BULK_MAX_WORKERS, COSMOS_CONNECTION, COSMOS_DB, COSMOS_CONTAINER, PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL,
+    INDEXING_POLICY, MAX_PATCH_OPERATIONS, NOT_MODIFIED, USE_FAKE_COSMOS, PreconditionFailed,
+    indexing_policy_outdated, is_container_missing, patch_operations, updatable_fields
+)
+from cosmos_metrics import metrics
+from product_cache import ProductCache
 
-COSMOS_CONNECTION = os.environ.get("COSMOS_CONN_STRING")
-# Align defaults with local.settings.json
-COSMOS_DB = os.environ.get("COSMOS_DB", "ProductsDB")
-COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER", "products")
+# Connections kept per host; requests' default of 10 would make bulk_write
+# threads beyond the tenth open and drop a connection per request
+COSMOS_POOL_SIZE = max(BULK_MAX_WORKERS, int(os.environ.get("COSMOS_POOL_SIZE", "10")))
 
 if not COSMOS_CONNECTION:
     raise Exception("COSMOS_CONN_STRING env variable missing")
 
-client = CosmosClient.from_connection_string(COSMOS_CONNECTION)
+if USE_FAKE_COSMOS:
+    from fake_cosmos import FakeCosmosClient
+    client = FakeCosmosClient.from_connection_string(COSMOS_CONNECTION)
+else:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=COSMOS_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    transport = RequestsTransport(session=session, session_owner=False)
+    client = CosmosClient.from_connection_string(COSMOS_CONNECTION, transport=transport)
 
-def get_container():
+# Container handle is provisioned once per worker and reused by every request
+_container = None
+_container_lock = threading.Lock()
+timings = {"cold_start_ms": None, "provision_count": 0, "warm_hits": 0}
+
+
+# Hot products are served from memory; update/delete invalidate their entry
+cache = ProductCache(max_items=PRODUCT_CACHE_SIZE, ttl_seconds=PRODUCT_CACHE_TTL)
+
+
+def provision_container():
+    """Create the database/container if needed and cache the handle."""
+    global _container
+    start = time.perf_counter()
     db = client.create_database_if_not_exists(id=COSMOS_DB)
     container = db.create_container_if_not_exists(
         id=COSMOS_CONTAINER,
         partition_key=PartitionKey(path="/id"),
+        indexing_policy=INDEXING_POLICY,
         offer_throughput=400
     )
+    # create_container_if_not_exists leaves an existing container's policy alone
+    properties = container.read()
+    if indexing_policy_outdated(properties.get("indexingPolicy")):
+        logging.info("Updating Cosmos indexing policy for filtered product queries")
+        container = db.replace_container(
+            container, partition_key=PartitionKey(path="/id"), indexing_policy=INDEXING_POLICY
+        )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _container = container
+    timings["cold_start_ms"] = elapsed_ms
+    timings["provision_count"] += 1
+    logging.info(f"Cosmos container {COSMOS_DB}/{COSMOS_CONTAINER} provisioned in {elapsed_ms:.1f} ms (cold start)")
     return container
 
+
+def get_container():
+    if _container is not None:
+        timings["warm_hits"] += 1
+        return _container
+    with _container_lock:
+        if _container is None:
+            return provision_container()
+    return _container
+
+
+def reset_container():
+    global _container
+    with _container_lock:
+        _container = None
+
+
+def warmup():
+    """One-time provisioning step, called from the Warmup function at host start."""
+    start = time.perf_counter()
+    get_container()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Cosmos warmup finished in {elapsed_ms:.1f} ms; timings={timings}")
+    return dict(timings)
+
+
+def with_container(operation):
+    """Run operation(container), re-provisioning once if the container was deleted."""
+    try:
+        return operation(get_container())
+    except exceptions.CosmosResourceNotFoundError as e:
+        if not is_container_missing(e):
+            raise
+        logging.warning("Cosmos container missing, re-provisioning")
+        reset_container()
+        return operation(get_container())
+
+
+def create_item(body):
+    with metrics.track("create", items=1) as t:
+        return with_container(lambda c: c.create_item(body, response_hook=t.hook))
+
+
+def _write_one(item, upsert):
+    try:
+        with metrics.track("upsert" if upsert else "create", items=1) as t:
+            if upsert:
+                with_container(lambda c: c.upsert_item(item, response_hook=t.hook))
+            else:
+                with_container(lambda c: c.create_item(item, response_hook=t.hook))
+        cache.invalidate(item["id"])
+        return {"id": item["id"], "status": 200 if upsert else 201}
+    except exceptions.CosmosHttpResponseError as e:
+        return {"id": item["id"], "status": e.status_code or 500, "error": e.message}
+    except AzureError as e:
+        # Connection/timeout errors carry no status; they fail this row, not the whole request
+        return {"id": item["id"], "status": 503, "error": str(e)}
+
+
+def bulk_write(items, upsert=False, max_workers=BULK_MAX_WORKERS):
+    """Write items concurrently with at most max_workers requests in flight.
+
+    Returns one result dict per item, in input order. Every product is its own
+    logical partition (/id), so there is nothing to group into transactional
+    batches; throughput comes from overlapping the round trips.
+    """
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(lambda item: _write_one(item, upsert), items))
+
+
+def _point_read(id, etag=None):
+    """Read one product by id/partition key. Returns None if it does not exist,
+    or NOT_MODIFIED when etag is given and still matches."""
+    kwargs = {"initial_headers": {"If-None-Match": etag}} if etag else {}
+    try:
+        with metrics.track("read", items=1) as t:
+            item = with_container(lambda c: c.read_item(item=id, partition_key=id, response_hook=t.hook, **kwargs))
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    except exceptions.CosmosHttpResponseError as e:
+        if etag and e.status_code == 304:
+            return NOT_MODIFIED
+        raise
+    if etag and not item:
+        return NOT_MODIFIED
+    return item
+
+
 def read_item(id):
-    container = get_container()
-    query = "SELECT * FROM c WHERE c.id = @id"
-    items = list(container.query_items(
-        query=query,
-        parameters=[{"name": "@id", "value": id}],
-        enable_cross_partition_query=True
-    ))
-    return items[0] if items else None
+    item, fresh = cache.get(id)
+    if item is not None and fresh:
+        return item
+
+    # Taken before the read: an update or delete meanwhile keeps the result out of the cache
+    generation = cache.generation()
+    result = _point_read(id, etag=item.get("_etag") if item else None)
+    if result is NOT_MODIFIED:
+        cache.touch(id)
+        return item
+    if result is None:
+        cache.invalidate(id)
+        return None
+    cache.put(id, result, generation)
+    return result
+
+
+def cache_stats():
+    return cache.stats()
+
+
+def metrics_snapshot():
+    return metrics.snapshot()
+
 
 def delete_item(id):
-    container = get_container()
-    container.delete_item(item=id, partition_key=id)
+    cache.invalidate(id)
+    with metrics.track("delete", items=1) as t:
+        with_container(lambda c: c.delete_item(item=id, partition_key=id, response_hook=t.hook))
+
 
-def update_item(id, updated_fields):
-    container = get_container()
-    item = read_item(id)
-    if not item:
+def update_item(id, updated_fields, etag=None):
+    """Apply updated_fields to a product in a single patch request.
+
+    When etag is given the write only succeeds if the stored item still has
+    that ETag, otherwise PreconditionFailed is raised. Returns None if the
+    item does not exist.
+    """
+    updated_fields = updatable_fields(updated_fields)
+    generation = cache.invalidate(id)
+    condition = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+
+    try:
+        if len(updated_fields) <= MAX_PATCH_OPERATIONS:
+            operations = patch_operations(updated_fields)
+            with metrics.track("patch", items=1) as t:
+                updated = with_container(lambda c: c.patch_item(
+                    item=id, partition_key=id, patch_operations=operations, response_hook=t.hook, **condition
+                ))
+        else:
+            # Too many fields for one patch: read + conditional replace
+            item = _point_read(id)
+            if not item:
+                return None
+            if etag and item.get("_etag") != etag:
+                raise PreconditionFailed(id)
+            item.update(updated_fields)
+            with metrics.track("replace", items=1) as t:
+                updated = with_container(lambda c: c.replace_item(
+                    item=id, body=item, etag=item["_etag"], match_condition=MatchConditions.IfNotModified,
+                    response_hook=t.hook
+                ))
+    except exceptions.CosmosResourceNotFoundError:
         return None
+    except exceptions.CosmosAccessConditionFailedError:
+        raise PreconditionFailed(id)
+
+    cache.put(id, updated, generation)
+    return updated
+
 
-    for key, value in updated_fields.items():
-        item[key] = value
+def query_page(query, parameters=None, limit=100, continuation=None):
+    """Run one page of a query. Returns (items, continuation token or None)."""
+    def run(c):
+        pager = c.query_items(
+            query=query,
+            parameters=parameters or [],
+            enable_cross_partition_query=True,
+            max_item_count=limit,
+            response_hook=t.hook
+        ).by_page(continuation)
+        items = list(next(pager, []))
+        t.items = len(items)
+        return items, pager.continuation_token
 
-    container.replace_item(item=item, body=item)
-    return item
\ No newline at end of file
+    with metrics.track("query") as t:
+        return with_container(run)
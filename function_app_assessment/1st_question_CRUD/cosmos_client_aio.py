@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import time
+import aiohttp
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
+from cosmos_common import (
+    BULK_MAX_WORKERS, COSMOS_CONNECTION, COSMOS_DB, COSMOS_CONTAINER, PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL,
+    INDEXING_POLICY, MAX_PATCH_OPERATIONS, NOT_MODIFIED, USE_FAKE_COSMOS, PreconditionFailed,
+    indexing_policy_outdated, is_container_missing, patch_operations, updatable_fields
+)
+from cosmos_metrics import metrics
+from product_cache import ProductCache
+
+# Async counterpart of cosmos_client, used when COSMOS_CLIENT_MODE=async.
+# One aio client and connection pool is shared by every in-flight request.
+
+COSMOS_AIO_POOL_SIZE = int(os.environ.get("COSMOS_AIO_POOL_SIZE", "100"))
+
+if not COSMOS_CONNECTION:
+    raise Exception("COSMOS_CONN_STRING env variable missing")
+
+# The aio client needs a running event loop, so it is created on first use
+_client = None
+_container = None
+_container_lock = None
+timings = {"cold_start_ms": None, "provision_count": 0, "warm_hits": 0}
+
+cache = ProductCache(max_items=PRODUCT_CACHE_SIZE, ttl_seconds=PRODUCT_CACHE_TTL)
+
+
+def _get_client():
+    global _client
+    if _client is None and USE_FAKE_COSMOS:
+        from fake_cosmos import AsyncFakeCosmosClient
+        _client = AsyncFakeCosmosClient.from_connection_string(COSMOS_CONNECTION)
+    if _client is None:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=COSMOS_AIO_POOL_SIZE))
+        transport = AioHttpTransport(session=session, session_owner=False)
+        _client = CosmosClient.from_connection_string(COSMOS_CONNECTION, transport=transport)
+    return _client
+
+
+async def provision_container():
+    """Create the database/container if needed and cache the handle."""
+    global _container
+    start = time.perf_counter()
+    db = await _get_client().create_database_if_not_exists(id=COSMOS_DB)
+    container = await db.create_container_if_not_exists(
+        id=COSMOS_CONTAINER,
+        partition_key=PartitionKey(path="/id"),
+        indexing_policy=INDEXING_POLICY,
+        offer_throughput=400
+    )
+    # create_container_if_not_exists leaves an existing container's policy alone
+    properties = await container.read()
+    if indexing_policy_outdated(properties.get("indexingPolicy")):
+        logging.info("Updating Cosmos indexing policy for filtered product queries")
+        container = await db.replace_container(
+            container, partition_key=PartitionKey(path="/id"), indexing_policy=INDEXING_POLICY
+        )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _container = container
+    timings["cold_start_ms"] = elapsed_ms
+    timings["provision_count"] += 1
+    logging.info(f"Cosmos container {COSMOS_DB}/{COSMOS_CONTAINER} provisioned in {elapsed_ms:.1f} ms (cold start, aio)")
+    return container
+
+
+async def get_container():
+    global _container_lock
+    if _container is not None:
+        timings["warm_hits"] += 1
+        return _container
+    if _container_lock is None:
+        _container_lock = asyncio.Lock()
+    async with _container_lock:
+        if _container is None:
+            return await provision_container()
+    return _container
+
+
+def reset_container():
+    global _container
+    _container = None
+
+
+async def warmup():
+    start = time.perf_counter()
+    await get_container()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Cosmos aio warmup finished in {elapsed_ms:.1f} ms; timings={timings}")
+    return dict(timings)
+
+
+async def with_container(operation):
+    """Await operation(container), re-provisioning once if the container was deleted."""
+    try:
+        return await operation(await get_container())
+    except exceptions.CosmosResourceNotFoundError as e:
+        if not is_container_missing(e):
+            raise
+        logging.warning("Cosmos container missing, re-provisioning")
+        reset_container()
+        return await operation(await get_container())
+
+
+async def create_item(body):
+    with metrics.track("create", items=1) as t:
+        return await with_container(lambda c: c.create_item(body, response_hook=t.hook))
+
+
+async def _write_one(item, upsert):
+    try:
+        with metrics.track("upsert" if upsert else "create", items=1) as t:
+            if upsert:
+                await with_container(lambda c: c.upsert_item(item, response_hook=t.hook))
+            else:
+                await with_container(lambda c: c.create_item(item, response_hook=t.hook))
+        cache.invalidate(item["id"])
+        return {"id": item["id"], "status": 200 if upsert else 201}
+    except exceptions.CosmosHttpResponseError as e:
+        return {"id": item["id"], "status": e.status_code or 500, "error": e.message}
+    except AzureError as e:
+        # Connection/timeout errors carry no status; they fail this row, not the whole request
+        return {"id": item["id"], "status": 503, "error": str(e)}
+
+
+async def bulk_write(items, upsert=False, max_workers=BULK_MAX_WORKERS):
+    """Async bulk_write: at most max_workers writes in flight, results in input order."""
+    limit = asyncio.Semaphore(max_workers)
+
+    async def write(item):
+        async with limit:
+            return await _write_one(item, upsert)
+
+    return list(await asyncio.gather(*(write(item) for item in items)))
+
+
+async def _point_read(id, etag=None):
+    kwargs = {"initial_headers": {"If-None-Match": etag}} if etag else {}
+    try:
+        with metrics.track("read", items=1) as t:
+            item = await with_container(lambda c: c.read_item(item=id, partition_key=id, response_hook=t.hook, **kwargs))
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    except exceptions.CosmosHttpResponseError as e:
+        if etag and e.status_code == 304:
+            return NOT_MODIFIED
+        raise
+    if etag and not item:
+        return NOT_MODIFIED
+    return item
+
+
+async def read_item(id):
+    item, fresh = cache.get(id)
+    if item is not None and fresh:
+        return item
+
+    # Taken before the read: an update or delete meanwhile keeps the result out of the cache
+    generation = cache.generation()
+    result = await _point_read(id, etag=item.get("_etag") if item else None)
+    if result is NOT_MODIFIED:
+        cache.touch(id)
+        return item
+    if result is None:
+        cache.invalidate(id)
+        return None
+    cache.put(id, result, generation)
+    return result
+
+
+def cache_stats():
+    return cache.stats()
+
+
+def metrics_snapshot():
+    return metrics.snapshot()
+
+
+async def delete_item(id):
+    cache.invalidate(id)
+    with metrics.track("delete", items=1) as t:
+        await with_container(lambda c: c.delete_item(item=id, partition_key=id, response_hook=t.hook))
+
+
+async def update_item(id, updated_fields, etag=None):
+    """Async version of cosmos_client.update_item (single patch, optional If-Match)."""
+    updated_fields = updatable_fields(updated_fields)
+    generation = cache.invalidate(id)
+    condition = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+
+    try:
+        if len(updated_fields) <= MAX_PATCH_OPERATIONS:
+            operations = patch_operations(updated_fields)
+            with metrics.track("patch", items=1) as t:
+                updated = await with_container(lambda c: c.patch_item(
+                    item=id, partition_key=id, patch_operations=operations, response_hook=t.hook, **condition
+                ))
+        else:
+            item = await _point_read(id)
+            if not item:
+                return None
+            if etag and item.get("_etag") != etag:
+                raise PreconditionFailed(id)
+            item.update(updated_fields)
+            with metrics.track("replace", items=1) as t:
+                updated = await with_container(lambda c: c.replace_item(
+                    item=id, body=item, etag=item["_etag"], match_condition=MatchConditions.IfNotModified,
+                    response_hook=t.hook
+                ))
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    except exceptions.CosmosAccessConditionFailedError:
+        raise PreconditionFailed(id)
+
+    cache.put(id, updated, generation)
+    return updated
+
+
+async def query_page(query, parameters=None, limit=100, continuation=None):
+    """Run one page of a query. Returns (items, continuation token or None)."""
+    async def run(c):
+        pager = c.query_items(
+            query=query,
+            parameters=parameters or [],
+            max_item_count=limit,
+            response_hook=t.hook
+        ).by_page(continuation)
+        items = []
+        async for page in pager:
+            items = [item async for item in page]
+            break
+        t.items = len(items)
+        return items, pager.continuation_token
+
+    with metrics.track("query") as t:
+        return await with_container(run)
@@ -0,0 +1,80 @@
+import os
+
+# Settings and helpers shared by the sync (cosmos_client) and async
+# (cosmos_client_aio) Cosmos paths. Importing this module opens no connections.
+
+COSMOS_CONNECTION = os.environ.get("COSMOS_CONN_STRING")
+# Align defaults with local.settings.json
+COSMOS_DB = os.environ.get("COSMOS_DB", "ProductsDB")
+COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER", "products")
+PRODUCT_CACHE_SIZE = int(os.environ.get("PRODUCT_CACHE_SIZE", "1024"))
+PRODUCT_CACHE_TTL = float(os.environ.get("PRODUCT_CACHE_TTL", "30"))
+# Most BulkAddProducts writes in flight at once
+BULK_MAX_WORKERS = int(os.environ.get("BULK_MAX_WORKERS", "16"))
+
+# COSMOS_CONN_STRING=memory:// swaps Cosmos for the in-memory fake_cosmos stand-in
+USE_FAKE_COSMOS = (COSMOS_CONNECTION or "").startswith("memory://")
+
+# "sync" uses cosmos_client, "async" uses cosmos_client_aio in the CRUD handlers
+USE_ASYNC = os.environ.get("COSMOS_CLIENT_MODE", "sync").lower() == "async"
+
+# Cosmos sub-status returned when the database/container itself is gone
+OWNER_RESOURCE_MISSING = 1003
+# Cosmos accepts at most this many operations in one patch request
+MAX_PATCH_OPERATIONS = 10
+
+# Only the fields the products route filters or sorts on are indexed. The
+# composite indexes serve "category = x ORDER BY price/name" in either direction.
+INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [
+        {"path": "/category/?"},
+        {"path": "/price/?"},
+        {"path": "/name/?"},
+    ],
+    "excludedPaths": [
+        {"path": "/*"},
+        {"path": "/\"_etag\"/?"},
+    ],
+    # Serve "WHERE c.category = @category ORDER BY c.category, c.<field>", both
+    # ascending or both descending (a composite index also serves its reverse)
+    "compositeIndexes": [
+        [{"path": "/category", "order": "ascending"}, {"path": "/price", "order": "ascending"}],
+        [{"path": "/category", "order": "ascending"}, {"path": "/name", "order": "ascending"}],
+    ],
+}
+
+
+def indexing_policy_outdated(current):
+    """True when an existing container's policy lacks the paths/composites above."""
+    current = current or {}
+    included = {p["path"] for p in current.get("includedPaths", [])}
+    wanted = {p["path"] for p in INDEXING_POLICY["includedPaths"]}
+    composites = current.get("compositeIndexes", [])
+    return not wanted <= included or any(c not in composites for c in INDEXING_POLICY["compositeIndexes"])
+
+
+# Returned by point reads when the cached ETag is still current
+NOT_MODIFIED = object()
+
+
+class PreconditionFailed(Exception):
+    """The item's ETag no longer matches the If-Match value sent by the client."""
+
+
+def is_container_missing(error):
+    return getattr(error, "sub_status", None) == OWNER_RESOURCE_MISSING
+
+
+def updatable_fields(fields):
+    """fields without id and the system properties Cosmos manages (_etag, _rid, _ts, _self, _attachments)."""
+    return {key: value for key, value in fields.items() if key != "id" and not key.startswith("_")}
+
+
+def patch_operations(updated_fields):
+    # JSON pointer escaping for field names
+    return [
+        {"op": "set", "path": "/" + key.replace("~", "~0").replace("/", "~1"), "value": value}
+        for key, value in updatable_fields(updated_fields).items()
+    ]
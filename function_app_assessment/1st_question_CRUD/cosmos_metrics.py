@@ -0,0 +1,181 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-operation request charge (RU), latency, item count and retry statistics
+# for every Cosmos call made by cosmos_client / cosmos_client_aio.
+
+METRICS_LOG_INTERVAL = float(os.environ.get("COSMOS_METRICS_LOG_INTERVAL", "60"))
+METRICS_OTEL = os.environ.get("COSMOS_METRICS_OTEL", "false").lower() == "true"
+
+RU_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds values <= bounds[i], the last slot the overflow."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th value (max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 2),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+inf"], self.counts)),
+        }
+
+
+class OperationStats:
+    def __init__(self):
+        self.request_charge = Histogram(RU_BUCKETS)
+        self.server_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.client_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.items = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = {}
+
+    def summary(self):
+        return {
+            "requestCharge": self.request_charge.summary(),
+            "serverMs": self.server_ms.summary(),
+            "clientMs": self.client_ms.summary(),
+            "items": self.items,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "errors": dict(self.errors),
+        }
+
+
+class Tracker:
+    """Collects response headers for one logical operation (a query may span pages)."""
+
+    def __init__(self, items=0):
+        self.request_charge = 0.0
+        self.server_ms = 0.0
+        self.retries = 0
+        self.items = items
+
+    def hook(self, headers, result=None):
+        # Passed to the SDK as response_hook; called once per response/page
+        headers = headers or {}
+        self.request_charge += float(headers.get("x-ms-request-charge", 0) or 0)
+        self.server_ms += float(headers.get("x-ms-request-duration-ms", 0) or 0)
+        self.retries += int(headers.get("x-ms-throttle-retry-count", 0) or 0)
+
+
+class CosmosMetrics:
+    def __init__(self):
+        self._ops = {}
+        self._lock = threading.Lock()
+        self._last_log = time.monotonic()
+        self._otel = self._create_otel_instruments() if METRICS_OTEL and otel_metrics else None
+
+    def _create_otel_instruments(self):
+        meter = otel_metrics.get_meter("products.cosmos")
+        return {
+            "requestCharge": meter.create_histogram("cosmos.request_charge", unit="RU"),
+            "serverMs": meter.create_histogram("cosmos.server_latency", unit="ms"),
+            "clientMs": meter.create_histogram("cosmos.client_latency", unit="ms"),
+            "retries": meter.create_counter("cosmos.retries"),
+        }
+
+    @contextmanager
+    def track(self, operation, items=0):
+        """Time one Cosmos operation. Pass tracker.hook as the SDK response_hook.
+
+        items is the number of documents a successful call touches; queries set
+        tracker.items themselves once the page is read.
+        """
+        tracker = Tracker(items)
+        start = time.perf_counter()
+        status = None
+        try:
+            yield tracker
+        except Exception as e:
+            status = getattr(e, "status_code", None) or "exception"
+            raise
+        finally:
+            self.record(operation, tracker, (time.perf_counter() - start) * 1000, status)
+
+    def record(self, operation, tracker, client_ms, status=None):
+        with self._lock:
+            stats = self._ops.setdefault(operation, OperationStats())
+            stats.request_charge.observe(tracker.request_charge)
+            stats.server_ms.observe(tracker.server_ms)
+            stats.client_ms.observe(client_ms)
+            stats.retries += tracker.retries
+            if status is None:
+                stats.items += tracker.items
+            else:
+                stats.errors[str(status)] = stats.errors.get(str(status), 0) + 1
+                if status == 429:
+                    stats.throttled += 1
+            should_log = METRICS_LOG_INTERVAL > 0 and time.monotonic() - self._last_log >= METRICS_LOG_INTERVAL
+
+        if self._otel:
+            attrs = {"operation": operation}
+            self._otel["requestCharge"].record(tracker.request_charge, attrs)
+            self._otel["serverMs"].record(tracker.server_ms, attrs)
+            self._otel["clientMs"].record(client_ms, attrs)
+            if tracker.retries:
+                self._otel["retries"].add(tracker.retries, attrs)
+
+        if should_log:
+            self.log_snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {op: stats.summary() for op, stats in self._ops.items()}
+
+    def log_snapshot(self):
+        """Emit the aggregated metrics as one structured (JSON) log line."""
+        with self._lock:
+            self._last_log = time.monotonic()
+        logging.info(json.dumps({"event": "cosmos_metrics", "operations": self.snapshot()}))
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+
+metrics = CosmosMetrics()
@@ -0,0 +1,470 @@
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+# In-memory stand-in for the subset of the Cosmos SDK used by cosmos_client and
+# cosmos_client_aio. Selected with COSMOS_CONN_STRING=memory:// so the CRUD app
+# can be run and benchmarked without a Cosmos account.
+
+FAKE_LATENCY_MS = float(os.environ.get("FAKE_COSMOS_LATENCY_MS", "0"))
+FAKE_THROTTLE_RATE = float(os.environ.get("FAKE_COSMOS_THROTTLE_RATE", "0"))
+# The real SDK retries 429s this many times before surfacing them
+FAKE_MAX_RETRIES = int(os.environ.get("FAKE_COSMOS_MAX_RETRIES", "9"))
+
+QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+COMPARISON = re.compile(r"^c\.(\w+)\s*(=|!=|>=|<=|>|<)\s*(@\w+)$")
+STARTSWITH = re.compile(r"^STARTSWITH\(\s*c\.(\w+)\s*,\s*(@\w+)\s*(?:,\s*(true|false)\s*)?\)$", re.IGNORECASE)
+IS_DEFINED = re.compile(r"^IS_DEFINED\(\s*c\.(\w+)\s*\)$", re.IGNORECASE)
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+}
+
+READ_CHARGE = 1.0
+WRITE_CHARGE = 5.7
+QUERY_PAGE_CHARGE = 2.8
+QUERY_ITEM_CHARGE = 0.05
+
+
+def _not_found(sub_status=0):
+    return exceptions.CosmosResourceNotFoundError(
+        status_code=404, message="Entity with the specified id does not exist in the system.", sub_status=sub_status
+    )
+
+
+def _compile_condition(text, params):
+    text = text.strip()
+    m = COMPARISON.match(text)
+    if m:
+        field, op, param = m.groups()
+        value = params[param]
+        compare = OPERATORS[op]
+
+        def check(doc):
+            if field not in doc:
+                return False
+            try:
+                return compare(doc[field], value)
+            except TypeError:
+                return False
+        return check
+    m = STARTSWITH.match(text)
+    if m:
+        field, param, ignore_case = m.groups()
+        prefix = params[param]
+        if ignore_case and ignore_case.lower() == "true":
+            return lambda doc: isinstance(doc.get(field), str) and doc[field].lower().startswith(prefix.lower())
+        return lambda doc: isinstance(doc.get(field), str) and doc[field].startswith(prefix)
+    m = IS_DEFINED.match(text)
+    if m:
+        field = m.group(1)
+        return lambda doc: field in doc
+    raise exceptions.CosmosHttpResponseError(status_code=400, message=f"Unsupported condition in fake: {text}")
+
+
+def run_query(docs, query, parameters):
+    """Evaluate the small SQL subset the CRUD app generates against a list of docs."""
+    m = QUERY.match(query)
+    if not m:
+        raise exceptions.CosmosHttpResponseError(status_code=400, message=f"Unsupported query in fake: {query}")
+    params = {p["name"]: p["value"] for p in parameters or []}
+
+    where = m.group("where")
+    if where:
+        checks = [_compile_condition(part, params) for part in re.split(r"\s+AND\s+", where, flags=re.IGNORECASE)]
+        docs = [d for d in docs if all(check(d) for check in checks)]
+
+    order = m.group("order")
+    if order:
+        # Apply the least significant key first; Python's sort is stable
+        for term in reversed([t.strip() for t in order.split(",")]):
+            parts = term.split()
+            field = parts[0][2:]
+            descending = len(parts) > 1 and parts[1].upper() == "DESC"
+            docs = sorted(docs, key=lambda d: (field in d, d.get(field)), reverse=descending)
+
+    select = m.group("select").strip()
+    if select != "*":
+        fields = [f.strip()[2:] for f in select.split(",")]
+        docs = [{f: d[f] for f in fields if f in d} for d in docs]
+    return docs
+
+
+class FakeStore:
+    """Documents of one container plus the item-level semantics (ETags, conflicts, patch)."""
+
+    def __init__(self, indexing_policy=None):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.deleted = False
+        self.indexing_policy = indexing_policy or {"includedPaths": [{"path": "/*"}], "compositeIndexes": []}
+
+    def _check_alive(self):
+        if self.deleted:
+            raise _not_found(sub_status=1003)
+
+    def _stamp(self, body):
+        doc = copy.deepcopy(body)
+        doc["_etag"] = f'"{uuid.uuid4()}"'
+        doc["_ts"] = int(time.time())
+        self.items[doc["id"]] = doc
+        return copy.deepcopy(doc)
+
+    def _check_etag(self, id, etag, match_condition):
+        if etag and match_condition == MatchConditions.IfNotModified and self.items[id]["_etag"] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(
+                status_code=412, message="Operation cannot be performed because one of the specified precondition is not met."
+            )
+
+    def create(self, body):
+        with self.lock:
+            self._check_alive()
+            if body["id"] in self.items:
+                raise exceptions.CosmosResourceExistsError(
+                    status_code=409, message="Entity with the specified id already exists in the system."
+                )
+            return self._stamp(body)
+
+    def upsert(self, body):
+        with self.lock:
+            self._check_alive()
+            return self._stamp(body)
+
+    def read(self, id, if_none_match=None):
+        with self.lock:
+            self._check_alive()
+            if id not in self.items:
+                raise _not_found()
+            doc = self.items[id]
+            if if_none_match and doc["_etag"] == if_none_match:
+                return {}  # 304: the SDK hands back an empty body
+            return copy.deepcopy(doc)
+
+    def replace(self, id, body, etag=None, match_condition=None):
+        with self.lock:
+            self._check_alive()
+            if id not in self.items:
+                raise _not_found()
+            self._check_etag(id, etag, match_condition)
+            return self._stamp(body)
+
+    def patch(self, id, operations, etag=None, match_condition=None):
+        with self.lock:
+            self._check_alive()
+            if id not in self.items:
+                raise _not_found()
+            self._check_etag(id, etag, match_condition)
+            doc = copy.deepcopy(self.items[id])
+            for op in operations:
+                key = op["path"].lstrip("/").replace("~1", "/").replace("~0", "~")
+                if op["op"] in ("set", "add", "replace"):
+                    doc[key] = op["value"]
+                elif op["op"] == "remove":
+                    doc.pop(key, None)
+                elif op["op"] == "incr":
+                    doc[key] = doc.get(key, 0) + op["value"]
+            return self._stamp(doc)
+
+    def delete(self, id):
+        with self.lock:
+            self._check_alive()
+            if self.items.pop(id, None) is None:
+                raise _not_found()
+
+    def query(self, query, parameters):
+        with self.lock:
+            self._check_alive()
+            docs = [copy.deepcopy(d) for d in self.items.values()]
+        return run_query(docs, query, parameters)
+
+
+class _Faults:
+    """Injected latency and 429 throttling, mirroring the SDK's retry loop."""
+
+    def __init__(self, latency_ms, throttle_rate, max_retries):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.max_retries = max_retries
+
+    def throttle_retries(self):
+        """Number of 429s the SDK would have retried; raises once retries are exhausted."""
+        retries = 0
+        while self.throttle_rate and random.random() < self.throttle_rate:
+            retries += 1
+            if retries > self.max_retries:
+                raise exceptions.CosmosHttpResponseError(status_code=429, message="Request rate is large.")
+        return retries
+
+    def headers(self, charge, retries, etag=None):
+        headers = {
+            "x-ms-request-charge": str(charge),
+            "x-ms-request-duration-ms": str(self.latency_ms),
+            "x-ms-throttle-retry-count": str(retries),
+        }
+        if etag:
+            headers["etag"] = etag
+        return headers
+
+
+def _continuation(offset, total):
+    return json.dumps({"offset": offset}) if offset < total else None
+
+
+def _offset(token):
+    return json.loads(token)["offset"] if token else 0
+
+
+class FakePager:
+    def __init__(self, container, docs, page_size, continuation, response_hook):
+        self._container = container
+        self._docs = docs
+        self._page_size = page_size
+        self._offset = _offset(continuation)
+        self._hook = response_hook
+        self._done = False
+        self.continuation_token = continuation
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        page = self._docs[self._offset:self._offset + self._page_size]
+        self._offset += len(page)
+        self.continuation_token = _continuation(self._offset, len(self._docs))
+        self._done = self.continuation_token is None
+        self._container._respond(QUERY_PAGE_CHARGE + QUERY_ITEM_CHARGE * len(page), self._hook, page)
+        return iter(page)
+
+
+class FakeItemPaged:
+    def __init__(self, container, docs, page_size, response_hook):
+        self._container = container
+        self._docs = docs
+        self._page_size = page_size or 100
+        self._hook = response_hook
+
+    def by_page(self, continuation_token=None):
+        return FakePager(self._container, self._docs, self._page_size, continuation_token, self._hook)
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+
+class FakeContainer:
+    def __init__(self, id, store, faults):
+        self.id = id
+        self._store = store
+        self._faults = faults
+
+    def _respond(self, charge, response_hook, result, etag=None):
+        retries = self._faults.throttle_retries()
+        if self._faults.latency_ms:
+            time.sleep(self._faults.latency_ms * (1 + retries) / 1000)
+        if response_hook:
+            response_hook(self._faults.headers(charge, retries, etag), result)
+        return result
+
+    def create_item(self, body, response_hook=None, **kwargs):
+        doc = self._store.create(body)
+        return self._respond(WRITE_CHARGE, response_hook, doc, doc["_etag"])
+
+    def upsert_item(self, body, response_hook=None, **kwargs):
+        doc = self._store.upsert(body)
+        return self._respond(WRITE_CHARGE, response_hook, doc, doc["_etag"])
+
+    def read_item(self, item, partition_key, response_hook=None, initial_headers=None, **kwargs):
+        doc = self._store.read(item, (initial_headers or {}).get("If-None-Match"))
+        return self._respond(READ_CHARGE, response_hook, doc, doc.get("_etag"))
+
+    def replace_item(self, item, body, etag=None, match_condition=None, response_hook=None, **kwargs):
+        doc = self._store.replace(item if isinstance(item, str) else item["id"], body, etag, match_condition)
+        return self._respond(WRITE_CHARGE, response_hook, doc, doc["_etag"])
+
+    def patch_item(self, item, partition_key, patch_operations, etag=None, match_condition=None,
+                   response_hook=None, **kwargs):
+        doc = self._store.patch(item, patch_operations, etag, match_condition)
+        return self._respond(WRITE_CHARGE, response_hook, doc, doc["_etag"])
+
+    def delete_item(self, item, partition_key, response_hook=None, **kwargs):
+        self._store.delete(item if isinstance(item, str) else item["id"])
+        return self._respond(WRITE_CHARGE, response_hook, None)
+
+    def query_items(self, query, parameters=None, max_item_count=None, response_hook=None, **kwargs):
+        docs = self._store.query(query, parameters)
+        return FakeItemPaged(self, docs, max_item_count, response_hook)
+
+    def read(self, **kwargs):
+        return {"id": self.id, "indexingPolicy": copy.deepcopy(self._store.indexing_policy)}
+
+
+class FakeDatabase:
+    def __init__(self, id, client):
+        self.id = id
+        self._client = client
+        self._stores = {}
+
+    def create_container_if_not_exists(self, id, partition_key=None, indexing_policy=None, **kwargs):
+        store = self._stores.get(id)
+        if store is None or store.deleted:
+            store = self._stores[id] = FakeStore(indexing_policy)
+        return self._client.container_type(id, store, self._client.faults)
+
+    def replace_container(self, container, partition_key=None, indexing_policy=None, **kwargs):
+        id = container if isinstance(container, str) else container.id
+        if indexing_policy is not None:
+            self._stores[id].indexing_policy = copy.deepcopy(indexing_policy)
+        return self.get_container_client(id)
+
+    def get_container_client(self, id):
+        return self._client.container_type(id, self._stores.setdefault(id, FakeStore()), self._client.faults)
+
+    def delete_container(self, id):
+        store = self._stores.pop(id, None)
+        if store:
+            store.deleted = True
+
+
+class FakeCosmosClient:
+    container_type = FakeContainer
+
+    def __init__(self, latency_ms=FAKE_LATENCY_MS, throttle_rate=FAKE_THROTTLE_RATE, max_retries=FAKE_MAX_RETRIES):
+        self.faults = _Faults(latency_ms, throttle_rate, max_retries)
+        self._databases = {}
+
+    @classmethod
+    def from_connection_string(cls, conn_str, **kwargs):
+        return cls()
+
+    def create_database_if_not_exists(self, id, **kwargs):
+        return self._databases.setdefault(id, FakeDatabase(id, self))
+
+    def get_database_client(self, id):
+        return self.create_database_if_not_exists(id)
+
+
+# Async variants used by cosmos_client_aio (COSMOS_CLIENT_MODE=async)
+
+class AsyncFakePager:
+    def __init__(self, pager):
+        self._pager = pager
+
+    @property
+    def continuation_token(self):
+        return self._pager.continuation_token
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._pager._done:
+            raise StopAsyncIteration
+        page = await self._pager._container._attempts(next, self._pager)
+        return _AsyncList(list(page))
+
+
+class _AsyncList:
+    def __init__(self, items):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncFakeItemPaged(FakeItemPaged):
+    def by_page(self, continuation_token=None):
+        return AsyncFakePager(super().by_page(continuation_token))
+
+    async def __aiter__(self):
+        async for page in self.by_page():
+            async for item in page:
+                yield item
+
+
+class AsyncFakeContainer(FakeContainer):
+    """Same semantics as FakeContainer; latency is awaited instead of slept."""
+
+    _retries = 0
+
+    async def _attempts(self, operation, *args, **kwargs):
+        """Await the latency of every attempt, retried 429s included, then run operation."""
+        retries = self._faults.throttle_retries()
+        if self._faults.latency_ms:
+            await asyncio.sleep(self._faults.latency_ms * (1 + retries) / 1000)
+        # Read by _respond inside operation; nothing else runs on the loop in between
+        self._retries = retries
+        return operation(*args, **kwargs)
+
+    def _respond(self, charge, response_hook, result, etag=None):
+        retries, self._retries = self._retries, 0
+        if response_hook:
+            response_hook(self._faults.headers(charge, retries, etag), result)
+        return result
+
+    async def create_item(self, body, **kwargs):
+        return await self._attempts(super().create_item, body, **kwargs)
+
+    async def upsert_item(self, body, **kwargs):
+        return await self._attempts(super().upsert_item, body, **kwargs)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        return await self._attempts(super().read_item, item, partition_key, **kwargs)
+
+    async def replace_item(self, item, body, **kwargs):
+        return await self._attempts(super().replace_item, item, body, **kwargs)
+
+    async def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        return await self._attempts(super().patch_item, item, partition_key, patch_operations, **kwargs)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        return await self._attempts(super().delete_item, item, partition_key, **kwargs)
+
+    def query_items(self, query, parameters=None, max_item_count=None, response_hook=None, **kwargs):
+        docs = self._store.query(query, parameters)
+        return AsyncFakeItemPaged(self, docs, max_item_count, response_hook)
+
+    async def read(self, **kwargs):
+        return super().read(**kwargs)
+
+
+class AsyncFakeDatabase(FakeDatabase):
+    async def create_container_if_not_exists(self, id, partition_key=None, **kwargs):
+        return FakeDatabase.create_container_if_not_exists(self, id, partition_key, **kwargs)
+
+    async def replace_container(self, container, partition_key=None, **kwargs):
+        return FakeDatabase.replace_container(self, container, partition_key, **kwargs)
+
+
+class AsyncFakeCosmosClient(FakeCosmosClient):
+    container_type = AsyncFakeContainer
+
+    async def create_database_if_not_exists(self, id, **kwargs):
+        return self._databases.setdefault(id, AsyncFakeDatabase(id, self))
+
+    def get_database_client(self, id):
+        return self._databases.setdefault(id, AsyncFakeDatabase(id, self))
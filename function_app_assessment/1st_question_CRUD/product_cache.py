@@ -0,0 +1,97 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProductCache:
+    """In-process read-through cache for product documents.
+
+    Entries expire after ttl_seconds and the least recently used entry is
+    evicted once max_items is reached. Expired entries are kept so that the
+    caller can revalidate them with their ETag instead of re-reading the body.
+
+    Items are copied in and out, so callers may modify what they get. Every
+    invalidation bumps a generation counter: a read takes generation() before
+    going to Cosmos and passes it to put(), which drops the result if the id
+    was invalidated while the read was in flight.
+    """
+
+    def __init__(self, max_items=1024, ttl_seconds=30):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # id -> generation of its last invalidation, for the most recent ones
+        self._invalidated = OrderedDict()
+        # Invalidations older than the tracked ones happened at or before this generation
+        self._invalidated_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def get(self, id):
+        """Return (item, is_fresh), or (None, False) when id is not cached."""
+        with self._lock:
+            entry = self._items.get(id)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._items.move_to_end(id)
+            item, expires_at = entry
+            if time.monotonic() < expires_at:
+                self.hits += 1
+                return copy.deepcopy(item), True
+            self.revalidations += 1
+            return copy.deepcopy(item), False
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def put(self, id, item, generation=None):
+        """Cache item. With generation (from generation() or invalidate()), skip
+        it when id has been invalidated since."""
+        with self._lock:
+            if generation is not None and self._invalidated.get(id, self._invalidated_floor) > generation:
+                return
+            self._items[id] = (copy.deepcopy(item), time.monotonic() + self.ttl_seconds)
+            self._items.move_to_end(id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, id):
+        """Extend the TTL of an entry whose ETag was confirmed unchanged."""
+        with self._lock:
+            entry = self._items.get(id)
+            if entry is not None:
+                self._items[id] = (entry[0], time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, id):
+        """Drop id. Returns the new generation, for a put() of the item written next."""
+        with self._lock:
+            self._items.pop(id, None)
+            self._generation += 1
+            self._invalidated.pop(id, None)
+            self._invalidated[id] = self._generation
+            while len(self._invalidated) > self.max_items:
+                _, generation = self._invalidated.popitem(last=False)
+                self._invalidated_floor = generation
+            return self._generation
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,105 @@
+import base64
+import math
+import re
+
+# Field names are interpolated into the SELECT list, so only plain identifiers are allowed
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_fields(raw):
+    """Turn 'id,name,price' into ['id', 'name', 'price']. Raises ValueError on bad names."""
+    if not raw:
+        return []
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    for f in fields:
+        if not FIELD_NAME.match(f):
+            raise ValueError(f"Invalid field name '{f}'")
+    return list(dict.fromkeys(fields))
+
+
+# orderBy values accepted on the products route; each has a matching index in INDEXING_POLICY
+SORTABLE_FIELDS = {"price", "name"}
+
+
+def build_select(fields):
+    if not fields:
+        return "SELECT * FROM c"
+    return "SELECT " + ", ".join(f"c.{f}" for f in fields) + " FROM c"
+
+
+def parse_filters(params):
+    """Read category/minPrice/maxPrice/namePrefix/orderBy/order from the query string.
+    Raises ValueError on invalid values."""
+    filters = {
+        "category": params.get("category") or None,
+        "name_prefix": params.get("namePrefix") or None,
+        "min_price": None,
+        "max_price": None,
+        "order_by": params.get("orderBy") or None,
+        "descending": False,
+    }
+    for key, name in (("min_price", "minPrice"), ("max_price", "maxPrice")):
+        if params.get(name):
+            try:
+                filters[key] = float(params[name])
+            except ValueError:
+                raise ValueError(f"Invalid '{name}'; must be numeric")
+            # float() also accepts "nan" and "inf", which no price compares with
+            if not math.isfinite(filters[key]):
+                raise ValueError(f"Invalid '{name}'; must be a finite number")
+
+    if filters["order_by"] and filters["order_by"] not in SORTABLE_FIELDS:
+        raise ValueError(f"'orderBy' must be one of: {', '.join(sorted(SORTABLE_FIELDS))}")
+
+    order = (params.get("order") or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("'order' must be 'asc' or 'desc'")
+    filters["descending"] = order == "desc"
+    return filters
+
+
+def build_query(fields=None, category=None, min_price=None, max_price=None, name_prefix=None,
+                order_by=None, descending=False):
+    """Build a parameterized Cosmos query. Returns (query, parameters)."""
+    conditions = []
+    parameters = []
+    if category is not None:
+        conditions.append("c.category = @category")
+        parameters.append({"name": "@category", "value": category})
+    if min_price is not None:
+        conditions.append("c.price >= @minPrice")
+        parameters.append({"name": "@minPrice", "value": min_price})
+    if max_price is not None:
+        conditions.append("c.price <= @maxPrice")
+        parameters.append({"name": "@maxPrice", "value": max_price})
+    if name_prefix is not None:
+        conditions.append("STARTSWITH(c.name, @namePrefix)")
+        parameters.append({"name": "@namePrefix", "value": name_prefix})
+
+    query = build_select(fields)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        direction = "DESC" if descending else "ASC"
+        if category is not None:
+            # Matches the category + field composite index; the category is fixed, so the order is the same
+            query += f" ORDER BY c.category {direction}, c.{order_by} {direction}"
+        else:
+            query += f" ORDER BY c.{order_by} {direction}"
+    return query, parameters
+
+
+def encode_continuation(token):
+    """Cosmos continuation tokens are JSON; hand clients an opaque url-safe string."""
+    if not token:
+        return None
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def decode_continuation(raw):
+    if not raw:
+        return None
+    try:
+        return base64.urlsafe_b64decode(raw.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid continuation token")
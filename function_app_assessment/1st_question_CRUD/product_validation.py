@@ -0,0 +1,18 @@
+def validate_product(body):
+    """Check a product document. Returns (product, error message or None)."""
+    if not isinstance(body, dict):
+        return None, "Product must be a JSON object"
+
+    if "id" not in body or not str(body.get("id")).strip():
+        return None, "Missing 'id' in body"
+
+    if "price" not in body:
+        return None, "Missing 'price' in body"
+
+    try:
+        price = float(body["price"])
+    except (ValueError, TypeError):
+        return None, "Invalid 'price' value; must be numeric"
+
+    body["price"] = price
+    return body, None
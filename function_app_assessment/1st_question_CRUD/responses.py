@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import json
+import os
+import azure.functions as func
+
+# Shared response encoding for the CRUD handlers: fast JSON, gzip/brotli
+# compression negotiated from Accept-Encoding, and ETag / If-None-Match.
+
+COMPRESS_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def encode_json(payload):
+    """Serialize to UTF-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:
+            pass  # e.g. non-str keys; the stdlib encoder is more lenient
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _accepted_encodings(req):
+    accepted = set()
+    for part in req.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if name:
+            accepted.add(name.lower())
+    return accepted
+
+
+def compress(req, body):
+    """Return (body, Content-Encoding or None) for the best encoding the client accepts."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = _accepted_encodings(req)
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted or "*" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def body_etag(body):
+    # Weak: the same representation may be sent gzip'd, brotli'd or plain
+    return 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _opaque(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(req, etag):
+    if not etag:
+        return False
+    header = req.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def encoded_response(req, body, mimetype="application/json", status_code=200, etag=None, headers=None):
+    """Build an HttpResponse from already-encoded bytes: 304 on a matching
+    If-None-Match, otherwise compressed according to Accept-Encoding."""
+    headers = dict(headers or {})
+    if etag:
+        headers["ETag"] = etag
+        if status_code == 200 and etag_matches(req, etag):
+            return func.HttpResponse(status_code=304, headers=headers)
+
+    body, encoding = compress(req, body)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    headers["Vary"] = "Accept-Encoding"
+    return func.HttpResponse(body, mimetype=mimetype, status_code=status_code, headers=headers)
+
+
+def json_response(req, payload, status_code=200, etag=None, headers=None, compute_etag=False):
+    """Encode payload as JSON and return it. compute_etag derives a weak ETag from the body."""
+    body = encode_json(payload)
+    if compute_etag and not etag:
+        etag = body_etag(body)
+    return encoded_response(req, body, status_code=status_code, etag=etag, headers=headers)
@@ -1,8 +1,14 @@
 import azure.functions as func
-import json
-from cosmos_client import update_item
+from cosmos_common import USE_ASYNC, PreconditionFailed, updatable_fields
+from responses import json_response
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+if USE_ASYNC:
+    import cosmos_client_aio as store
+else:
+    import cosmos_client as store
+
+def _parse(req):
+    """Returns (id, updated_fields, etag, error response)."""
     # Prefer id from route (function.json route: products/{id}), fallback to body
     route_id = req.route_params.get('id')
 
@@ -17,30 +23,61 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     elif body and "id" in body:
         id = body.get("id")
     else:
-        return func.HttpResponse("Missing 'id' (in route or body)", status_code=400)
+        return None, None, None, func.HttpResponse("Missing 'id' (in route or body)", status_code=400)
 
     # Build fields to update: prefer body content (except id)
     if not body:
-        return func.HttpResponse("Missing JSON body with fields to update", status_code=400)
+        return None, None, None, func.HttpResponse("Missing JSON body with fields to update", status_code=400)
 
-    # Remove id from updated fields if present
-    updated_fields = {k: v for k, v in body.items() if k != "id"}
+    # id and Cosmos system properties (_etag, _ts, ...) cannot be updated
+    updated_fields = updatable_fields(body)
 
     if not updated_fields:
-        return func.HttpResponse("No fields to update", status_code=400)
+        return None, None, None, func.HttpResponse("No fields to update", status_code=400)
+
+    # Optional optimistic concurrency: only apply if the client's ETag is current
+    etag = req.headers.get("If-Match")
+    if etag == "*":
+        etag = None
+
+    return id, updated_fields, etag, None
+
+def _response(req, updated_item):
+    if not updated_item:
+        return func.HttpResponse("Not found", status_code=404)
+
+    return json_response(req, updated_item, headers={"ETag": updated_item.get("_etag", "")})
+
+def main_sync(req: func.HttpRequest) -> func.HttpResponse:
+    id, updated_fields, etag, error = _parse(req)
+    if error:
+        return error
 
     try:
-        updated_item = update_item(id, updated_fields)
+        updated_item = store.update_item(id, updated_fields, etag=etag)
+    except PreconditionFailed:
+        return func.HttpResponse("Item was modified by another request", status_code=412)
     except Exception as e:
         # Log exception to function logs (Azure Functions will capture stdout/stderr)
         print(f"Error updating item {id}: {e}")
         return func.HttpResponse("Internal server error", status_code=500)
 
-    if not updated_item:
-        return func.HttpResponse("Not found", status_code=404)
+    return _response(req, updated_item)
+
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    id, updated_fields, etag, error = _parse(req)
+    if error:
+        return error
+
+    try:
+        updated_item = await store.update_item(id, updated_fields, etag=etag)
+    except PreconditionFailed:
+        return func.HttpResponse("Item was modified by another request", status_code=412)
+    except Exception as e:
+        print(f"Error updating item {id}: {e}")
+        return func.HttpResponse("Internal server error", status_code=500)
+
+    return _response(req, updated_item)
 
-    return func.HttpResponse(
-        json.dumps(updated_item),
-        mimetype="application/json",
-        status_code=200
-    )
\ No newline at end of file
+# COSMOS_CLIENT_MODE decides which handler the Functions host runs
+main = main_async if USE_ASYNC else main_sync
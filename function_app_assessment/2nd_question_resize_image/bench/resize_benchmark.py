@@ -0,0 +1,231 @@
+"""Benchmark the resize worker against the in-memory blob stand-in.
+
+For every (source format, resolution) scenario, synthetic photo-like images
+are uploaded to the fake storage account and run through resize_job.process_job,
+exactly as auto_resize_image would, with `--concurrency` jobs in flight. Each
+scenario runs in its own process so its peak RSS is not skewed by the others.
+Reports images/s (total and per core), job and per-rendition latency, peak
+RSS and output bytes.
+
+    python bench/resize_benchmark.py --images 20 --resolutions 1920x1080,4000x3000
+    python bench/resize_benchmark.py --output-format webp --save-baseline
+    python bench/resize_benchmark.py --compare bench/resize_baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(APP_DIR, "bench", "resize_baseline.json")
+SOURCE_EXTENSIONS = {"jpeg": ".jpg", "png": ".png"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", default="jpeg,png", help="source formats: jpeg, png")
+    parser.add_argument("--resolutions", default="640x480,1920x1080,4000x3000")
+    parser.add_argument("--images", type=int, default=10, help="images per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="jobs processed at the same time")
+    parser.add_argument("--sizes", default="320,1024")
+    parser.add_argument("--output-format", default="source", help="profile format: auto, source, jpeg, png, webp, avif")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="injected latency per storage call")
+    parser.add_argument("--json", help="write the report to this file as JSON")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write the report as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="compare against a saved baseline")
+    return parser.parse_args()
+
+
+def synthetic_image(width, height, seed):
+    """Deterministic photo-like RGB image: gradients, shapes, blur and sensor noise."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    red = Image.linear_gradient("L").rotate(rng.randrange(360)).resize((width, height))
+    green = Image.radial_gradient("L").resize((width, height))
+    blue = Image.linear_gradient("L").transpose(Image.Transpose.FLIP_TOP_BOTTOM).resize((width, height))
+    img = Image.merge("RGB", (red, green, blue))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(max(2, min(width, height) // 4))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    img = img.filter(ImageFilter.GaussianBlur(max(1, width // 400)))
+
+    noise = Image.effect_noise((width, height), 12).convert("RGB")
+    return Image.blend(img, noise, 0.08)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))], 2)
+
+
+def run_scenario(config):
+    """Runs in a fresh process: configure the app for memory://, upload, resize, measure."""
+    os.environ["AzureWebJobsStorage"] = "memory://"
+    os.environ["BLOB_CONTAINER"] = "uploads"
+    os.environ["RESIZED_CONTAINER"] = "resized"
+    os.environ["FAKE_BLOB_LATENCY_MS"] = str(config["latencyMs"])
+    sys.path.insert(0, APP_DIR)
+    import resize_job
+    from storage_clients import get_container
+
+    width, height = config["resolution"]
+    ext = SOURCE_EXTENSIONS[config["format"]]
+    uploads = get_container("uploads")
+    source_bytes = 0
+    jobs = []
+    for i in range(config["images"]):
+        buf = io.BytesIO()
+        synthetic_image(width, height, seed=i).save(buf, format=config["format"].upper())
+        name = f"bench-{i}{ext}"
+        uploads.get_blob_client(name).upload_blob(buf.getvalue(), overwrite=True)
+        source_bytes += buf.tell()
+        jobs.append({"blobUrl": f"https://memory/uploads/{name}", "profile": config["profile"]})
+    rss_before = peak_rss_mb()
+
+    renditions = {}
+    publish = resize_job.publish_rendition
+
+    def timed_publish(name, size, *args):
+        # Encode + upload of one rendition, on the worker's rendition pool
+        start = time.perf_counter()
+        url, nbytes = publish(name, size, *args)
+        renditions.setdefault(size, []).append(((time.perf_counter() - start) * 1000, nbytes))
+        return url, nbytes
+    resize_job.publish_rendition = timed_publish
+
+    job_ms = []
+
+    def run(job):
+        start = time.perf_counter()
+        resize_job.process_job(resize_job.parse_job(json.dumps(job)))
+        job_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    # The worker logs one JSON line per job; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=config["concurrency"]) as pool:
+        list(pool.map(run, jobs))
+    elapsed = time.perf_counter() - start
+
+    job_ms.sort()
+    images_per_second = len(jobs) / elapsed if elapsed else None
+    cores = min(config["concurrency"], os.cpu_count() or 1)
+    return {
+        "images": len(jobs),
+        "elapsedSeconds": round(elapsed, 3),
+        "imagesPerSecond": round(images_per_second, 2),
+        "imagesPerSecondPerCore": round(images_per_second / cores, 2),
+        "jobP50Ms": percentile(job_ms, 0.50),
+        "jobP95Ms": percentile(job_ms, 0.95),
+        "renditions": {
+            str(size): {
+                "p50Ms": percentile(sorted(ms for ms, _ in samples), 0.50),
+                "p95Ms": percentile(sorted(ms for ms, _ in samples), 0.95),
+                "meanBytes": round(sum(n for _, n in samples) / len(samples)),
+            }
+            for size, samples in sorted(renditions.items())
+        },
+        "sourceBytes": source_bytes,
+        "outputBytes": sum(n for samples in renditions.values() for _, n in samples),
+        "rssBeforeMb": rss_before,
+        "peakRssMb": peak_rss_mb(),
+    }
+
+
+def build_scenarios(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    profile = {"sizes": sizes, "format": args.output_format, "quality": args.quality, "stripMetadata": True}
+    for fmt in args.formats.split(","):
+        for resolution in args.resolutions.split(","):
+            width, height = (int(v) for v in resolution.lower().split("x"))
+            yield f"{fmt}-{width}x{height}", {
+                "format": fmt, "resolution": (width, height), "images": args.images,
+                "concurrency": args.concurrency, "latencyMs": args.latency_ms, "profile": profile,
+            }
+
+
+def environment():
+    import PIL
+    return {"python": platform.python_version(), "pillow": PIL.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def print_report(report):
+    print(f"concurrency={report['config']['concurrency']} sizes={report['config']['sizes']} "
+          f"output={report['config']['outputFormat']} latency_ms={report['config']['latencyMs']}")
+    print(f"{'scenario':<20}{'img/s':>8}{'img/s/core':>12}{'job p50':>10}{'job p95':>10}"
+          f"{'peak MB':>9}{'src KB':>10}{'out KB':>9}")
+    for name, s in report["scenarios"].items():
+        print(f"{name:<20}{s['imagesPerSecond']:>8}{s['imagesPerSecondPerCore']:>12}{s['jobP50Ms']:>10}"
+              f"{s['jobP95Ms']:>10}{s['peakRssMb'] or '-':>9}{s['sourceBytes'] // 1024:>10}{s['outputBytes'] // 1024:>9}")
+        for size, r in s["renditions"].items():
+            print(f"  {size + 'px':<18}p50 {r['p50Ms']} ms  p95 {r['p95Ms']} ms  mean {r['meanBytes']} bytes")
+
+
+def _delta(new, old):
+    if not old or new is None:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def print_comparison(report, baseline):
+    print(f"\nvs baseline ({baseline.get('environment', {})})")
+    print(f"{'scenario':<20}{'img/s':>10}{'job p95':>10}{'peak MB':>10}{'out bytes':>11}")
+    for name, s in report["scenarios"].items():
+        b = baseline.get("scenarios", {}).get(name)
+        if not b:
+            print(f"{name:<20}  (not in baseline)")
+            continue
+        print(f"{name:<20}{_delta(s['imagesPerSecond'], b['imagesPerSecond']):>10}"
+              f"{_delta(s['jobP95Ms'], b['jobP95Ms']):>10}{_delta(s['peakRssMb'], b['peakRssMb']):>10}"
+              f"{_delta(s['outputBytes'], b['outputBytes']):>11}")
+
+
+def main():
+    args = parse_args()
+    report = {
+        "environment": environment(),
+        "config": {"concurrency": args.concurrency, "sizes": args.sizes, "outputFormat": args.output_format,
+                   "quality": args.quality, "latencyMs": args.latency_ms, "images": args.images},
+        "scenarios": {},
+    }
+    # spawn: every scenario starts from a clean interpreter, so peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    for name, config in build_scenarios(args):
+        with context.Pool(1) as pool:
+            report["scenarios"][name] = pool.apply(run_scenario, (config,))
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
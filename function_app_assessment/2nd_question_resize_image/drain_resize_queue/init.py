@@ -0,0 +1,116 @@
+import azure.functions as func
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from azure.core.exceptions import AzureError
+from resize_job import InvalidJob, parse_job, process_job
+from storage_clients import get_queue
+
+# Alternative to the auto_resize_image queue trigger: pulls up to
+# DRAIN_BATCH_SIZE messages per receive, runs them on a pool, keeps them
+# invisible while they run and moves messages that keep failing to the
+# poison queue. Enable with RESIZE_DRAIN_ENABLED=true and disable the trigger
+# with the app setting AzureWebJobs.auto_resize_image.Disabled=true.
+
+QUEUE_NAME = os.environ["QUEUE_NAME"]
+POISON_QUEUE_NAME = f"{QUEUE_NAME}-poison"
+RESIZE_DRAIN_ENABLED = os.environ.get("RESIZE_DRAIN_ENABLED", "false").lower() == "true"
+# Messages per receive (the service caps this at 32) and jobs run at the same time
+DRAIN_BATCH_SIZE = min(32, int(os.environ.get("DRAIN_BATCH_SIZE", "32")))
+DRAIN_CONCURRENCY = int(os.environ.get("DRAIN_CONCURRENCY", "4"))
+# How long one invocation keeps draining, and how long a received message stays hidden
+DRAIN_MAX_SECONDS = float(os.environ.get("DRAIN_MAX_SECONDS", "240"))
+DRAIN_VISIBILITY_TIMEOUT = int(os.environ.get("DRAIN_VISIBILITY_TIMEOUT", "60"))
+# Same default as the host's queues.maxDequeueCount
+MAX_DEQUEUE_COUNT = int(os.environ.get("MAX_DEQUEUE_COUNT", "5"))
+RETRY_DELAY_SECONDS = int(os.environ.get("DRAIN_RETRY_DELAY_SECONDS", "10"))
+
+job_pool = ThreadPoolExecutor(max_workers=DRAIN_CONCURRENCY)
+
+
+def extend_visibility(queue, message, seconds):
+    """Hide message for another `seconds`; the pop receipt changes on every update."""
+    updated = queue.update_message(message, visibility_timeout=seconds)
+    message.pop_receipt = updated.pop_receipt
+    message.next_visible_on = updated.next_visible_on
+
+
+def poison(queue, message, reason):
+    print(f"Moving message {message.id} to {POISON_QUEUE_NAME}: {reason}")
+    get_queue(POISON_QUEUE_NAME).send_message(message.content)
+    queue.delete_message(message)
+
+
+def settle(queue, message, error):
+    """Delete a finished message, or schedule/poison a failed one."""
+    if error is None:
+        queue.delete_message(message)
+    elif isinstance(error, InvalidJob) or message.dequeue_count >= MAX_DEQUEUE_COUNT:
+        poison(queue, message, error)
+    else:
+        # Back off before the next attempt instead of waiting out the full lease
+        print(f"Job {message.id} failed (attempt {message.dequeue_count}): {error}")
+        extend_visibility(queue, message, RETRY_DELAY_SECONDS * message.dequeue_count)
+
+
+def run_batch(queue, messages):
+    """Process one received batch, renewing the lease of jobs that are still running."""
+    running = {}
+    for message in messages:
+        try:
+            job = parse_job(message.content)
+        except InvalidJob as e:
+            settle(queue, message, e)
+            continue
+        running[job_pool.submit(process_job, job)] = message
+
+    renew_every = DRAIN_VISIBILITY_TIMEOUT / 2
+    last_renewal = time.monotonic()
+    while running:
+        done, _ = wait(running, timeout=renew_every, return_when=FIRST_COMPLETED)
+        for future in done:
+            message = running.pop(future)
+            try:
+                settle(queue, message, future.exception())
+            except AzureError as e:
+                # Lease already lost; the message reappears and is retried
+                print(f"Could not settle message {message.id}: {e}")
+
+        if running and time.monotonic() - last_renewal >= renew_every:
+            for message in running.values():
+                try:
+                    extend_visibility(queue, message, DRAIN_VISIBILITY_TIMEOUT)
+                except AzureError as e:
+                    print(f"Could not extend message {message.id}: {e}")
+            last_renewal = time.monotonic()
+
+
+def main(timer: func.TimerRequest):
+    if not RESIZE_DRAIN_ENABLED:
+        return
+
+    queue = get_queue(QUEUE_NAME)
+    deadline = time.monotonic() + DRAIN_MAX_SECONDS
+    processed = 0
+
+    while time.monotonic() < deadline:
+        # Without messages_per_page the pager fetches one message per request
+        messages = list(queue.receive_messages(max_messages=DRAIN_BATCH_SIZE,
+                                               messages_per_page=DRAIN_BATCH_SIZE,
+                                               visibility_timeout=DRAIN_VISIBILITY_TIMEOUT))
+        if not messages:
+            break
+
+        fresh = []
+        for message in messages:
+            # A job that keeps crashing the worker never reaches settle()
+            if message.dequeue_count > MAX_DEQUEUE_COUNT:
+                poison(queue, message, "dequeue count exceeded")
+            else:
+                fresh.append(message)
+
+        run_batch(queue, fresh)
+        processed += len(messages)
+
+    if processed:
+        print(f"Drained {processed} messages from {QUEUE_NAME}")
@@ -0,0 +1,260 @@
+import base64
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+# In-memory stand-in for the subset of the Blob and Queue SDKs used by this
+# app. Selected with AzureWebJobsStorage=memory:// (see storage_clients) so the
+# pipeline can be run and benchmarked without a storage account or Azurite.
+
+FAKE_LATENCY_MS = float(os.environ.get("FAKE_BLOB_LATENCY_MS", "0"))
+ACCOUNT_NAME = "memory"
+# Any valid base64 works; SAS tokens are signed but never checked
+ACCOUNT_KEY = base64.b64encode(b"fake-blob-account-key").decode()
+
+
+def _delay():
+    if FAKE_LATENCY_MS:
+        time.sleep(FAKE_LATENCY_MS / 1000)
+
+
+def _not_found(name):
+    return ResourceNotFoundError(f"The specified blob does not exist: {name}")
+
+
+class _Blob:
+    def __init__(self, data, metadata, content_settings):
+        self.data = data
+        self.metadata = dict(metadata or {})
+        self.content_type = getattr(content_settings, "content_type", None)
+        self.etag = f'"{uuid.uuid4().hex}"'
+        self.last_modified = datetime.now(timezone.utc)
+
+    def properties(self, name):
+        return SimpleNamespace(name=name, size=len(self.data), metadata=dict(self.metadata), etag=self.etag,
+                               last_modified=self.last_modified,
+                               content_settings=SimpleNamespace(content_type=self.content_type))
+
+
+class FakeStorage:
+    """Containers of blobs plus queues, shared by every client of one account."""
+
+    def __init__(self):
+        self.containers = {}
+        self.queues = {}
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+
+class FakeDownloader:
+    def __init__(self, blob, name):
+        self._data = blob.data
+        self.properties = blob.properties(name)
+        self.size = len(self._data)
+
+    def readall(self):
+        return self._data
+
+    def chunks(self):
+        for i in range(0, len(self._data), 4 * 1024 * 1024):
+            yield self._data[i:i + 4 * 1024 * 1024]
+
+
+class FakeBlobClient:
+    def __init__(self, storage, container, name):
+        self._storage = storage
+        self.container_name = container
+        self.blob_name = name
+        self.url = f"https://{ACCOUNT_NAME}.blob.core.windows.net/{container}/{name}"
+
+    def _blobs(self):
+        blobs = self._storage.containers.get(self.container_name)
+        if blobs is None:
+            raise ResourceNotFoundError(f"The specified container does not exist: {self.container_name}")
+        return blobs
+
+    def _get(self):
+        blob = self._blobs().get(self.blob_name)
+        if blob is None:
+            raise _not_found(self.blob_name)
+        return blob
+
+    def _put(self, data, overwrite, metadata, content_settings):
+        with self._storage.lock:
+            blobs = self._blobs()
+            if not overwrite and self.blob_name in blobs:
+                raise ResourceExistsError(f"The specified blob already exists: {self.blob_name}")
+            blob = blobs[self.blob_name] = _Blob(bytes(data), metadata, content_settings)
+        return {"etag": blob.etag, "last_modified": blob.last_modified}
+
+    def upload_blob(self, data, overwrite=False, metadata=None, content_settings=None, **kwargs):
+        _delay()
+        if hasattr(data, "read"):
+            data = data.read()
+        elif not isinstance(data, (bytes, bytearray, str)):
+            data = b"".join(data)
+        if isinstance(data, str):
+            data = data.encode()
+        return self._put(data, overwrite, metadata, content_settings)
+
+    def upload_blob_from_url(self, source_url, overwrite=False, metadata=None, content_settings=None, **kwargs):
+        _delay()
+        path = source_url.split("?")[0].split(".blob.core.windows.net/", 1)[1]
+        container, name = path.split("/", 1)
+        source = FakeBlobClient(self._storage, container, name)._get()
+        return self._put(source.data, overwrite, metadata, content_settings)
+
+    def stage_block(self, block_id, data, **kwargs):
+        _delay()
+        with self._storage.lock:
+            self._storage.blocks.setdefault((self.container_name, self.blob_name), {})[block_id] = bytes(data)
+
+    def commit_block_list(self, block_list, metadata=None, content_settings=None, **kwargs):
+        _delay()
+        with self._storage.lock:
+            staged = self._storage.blocks.pop((self.container_name, self.blob_name), {})
+        return self._put(b"".join(staged[b] for b in block_list), True, metadata, content_settings)
+
+    def download_blob(self, **kwargs):
+        _delay()
+        return FakeDownloader(self._get(), self.blob_name)
+
+    def get_blob_properties(self, **kwargs):
+        _delay()
+        return self._get().properties(self.blob_name)
+
+    def exists(self, **kwargs):
+        try:
+            self._get()
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    def delete_blob(self, **kwargs):
+        _delay()
+        with self._storage.lock:
+            if self._blobs().pop(self.blob_name, None) is None:
+                raise _not_found(self.blob_name)
+
+
+class FakeContainerClient:
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.container_name = name
+
+    def create_container(self, **kwargs):
+        with self._storage.lock:
+            if self.container_name in self._storage.containers:
+                raise ResourceExistsError(f"The specified container already exists: {self.container_name}")
+            self._storage.containers[self.container_name] = {}
+
+    def get_blob_client(self, blob):
+        return FakeBlobClient(self._storage, self.container_name, blob)
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        blobs = dict(self._storage.containers.get(self.container_name, {}))
+        return [blob.properties(name) for name, blob in sorted(blobs.items())
+                if not name_starts_with or name.startswith(name_starts_with)]
+
+
+class FakeBlobServiceClient:
+    account_name = ACCOUNT_NAME
+    credential = SimpleNamespace(account_name=ACCOUNT_NAME, account_key=ACCOUNT_KEY)
+
+    def __init__(self, storage=None):
+        self.storage = storage or FakeStorage()
+
+    def get_container_client(self, container):
+        return FakeContainerClient(self.storage, container)
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self.storage, container, blob)
+
+
+class FakeQueueClient:
+    """Visibility timeouts, pop receipts and dequeue counts like Storage queues."""
+
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.queue_name = name
+
+    def _messages(self):
+        messages = self._storage.queues.get(self.queue_name)
+        if messages is None:
+            raise ResourceNotFoundError(f"The specified queue does not exist: {self.queue_name}")
+        return messages
+
+    def create_queue(self, **kwargs):
+        with self._storage.lock:
+            if self.queue_name in self._storage.queues:
+                raise ResourceExistsError(f"The specified queue already exists: {self.queue_name}")
+            self._storage.queues[self.queue_name] = {}
+
+    def send_message(self, content, visibility_timeout=None, **kwargs):
+        _delay()
+        message = SimpleNamespace(id=uuid.uuid4().hex, content=content, dequeue_count=0,
+                                  pop_receipt=None, visible_at=time.monotonic() + (visibility_timeout or 0))
+        with self._storage.lock:
+            self._messages()[message.id] = message
+        return message
+
+    def receive_messages(self, max_messages=None, visibility_timeout=30, messages_per_page=None, **kwargs):
+        # Like the SDK pager: one round trip per page of messages_per_page (the
+        # service default is 1), until max_messages are received or a page is empty
+        per_page = messages_per_page or 1
+        received = 0
+        while max_messages is None or received < max_messages:
+            _delay()
+            page = min(per_page, max_messages - received) if max_messages else per_page
+            now = time.monotonic()
+            batch = []
+            with self._storage.lock:
+                for message in self._messages().values():
+                    if len(batch) == page:
+                        break
+                    if message.visible_at <= now:
+                        message.visible_at = now + visibility_timeout
+                        message.dequeue_count += 1
+                        message.pop_receipt = uuid.uuid4().hex
+                        batch.append(SimpleNamespace(**vars(message)))
+            if not batch:
+                return
+            received += len(batch)
+            yield from batch
+
+    def _current(self, message, pop_receipt):
+        current = self._messages().get(message.id)
+        if current is None or current.pop_receipt != (pop_receipt or message.pop_receipt):
+            raise ResourceNotFoundError("The specified message does not exist or the pop receipt is stale")
+        return current
+
+    def update_message(self, message, pop_receipt=None, content=None, visibility_timeout=None, **kwargs):
+        _delay()
+        with self._storage.lock:
+            current = self._current(message, pop_receipt)
+            current.visible_at = time.monotonic() + (visibility_timeout or 0)
+            current.pop_receipt = uuid.uuid4().hex
+            if content is not None:
+                current.content = content
+            return SimpleNamespace(id=current.id, pop_receipt=current.pop_receipt, next_visible_on=None)
+
+    def delete_message(self, message, pop_receipt=None, **kwargs):
+        _delay()
+        with self._storage.lock:
+            self._current(message, pop_receipt)
+            del self._messages()[message.id]
+
+
+_storage = FakeStorage()
+
+
+def blob_service_client():
+    return FakeBlobServiceClient(_storage)
+
+
+def queue_client(name):
+    return FakeQueueClient(_storage, name)
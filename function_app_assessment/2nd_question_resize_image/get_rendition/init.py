@@ -0,0 +1,96 @@
+import azure.functions as func
+import os
+from azure.core.exceptions import ResourceNotFoundError
+from rendition_cache import Rendition, RenditionCache, SingleFlight
+from rendition_profiles import (SOURCE_FORMATS, InvalidProfile, build_profile, negotiated_format, output_format,
+                                output_name, rendition_path)
+from resize_engine import ImageTooLarge
+from resize_job import RESIZED_CONTAINER, blob_service, render_rendition
+
+# GET /api/resized/{size}/{filename}: serve a rendition of an uploaded image,
+# rendering it on first request. Lookups go memory LRU -> RESIZED_CONTAINER ->
+# render from the original, and concurrent misses for the same rendition
+# collapse into one blob read or render per worker.
+
+# Sizes the endpoint will render; anything else could be used to fill storage
+ONDEMAND_SIZES = {int(s) for s in os.environ.get("ONDEMAND_SIZES", "160,320,640,1024,2048").split(",")}
+RENDITION_CACHE_BYTES = int(os.environ.get("RENDITION_CACHE_BYTES", str(64 * 1024 * 1024)))
+RENDITION_CACHE_ITEM_BYTES = int(os.environ.get("RENDITION_CACHE_ITEM_BYTES", str(2 * 1024 * 1024)))
+RENDITION_MAX_AGE = int(os.environ.get("RENDITION_MAX_AGE", "86400"))
+
+hot_renditions = RenditionCache(RENDITION_CACHE_BYTES, RENDITION_CACHE_ITEM_BYTES)
+in_flight = SingleFlight()
+
+
+def load_rendition(path, filename, size, profile):
+    """Stored rendition from RESIZED_CONTAINER, rendered from the original when missing.
+    Returns (Rendition, "blob" or "render")."""
+    try:
+        download = blob_service.get_blob_client(RESIZED_CONTAINER, path).download_blob()
+        props = download.properties
+        return Rendition(download.readall(), props.content_settings.content_type, props.etag), "blob"
+    except ResourceNotFoundError:
+        pass
+    _, data, content_type, etag = render_rendition(filename, size, profile)
+    return Rendition(data, content_type, etag), "render"
+
+
+def rendition_response(req, rendition, source):
+    headers = {
+        "Cache-Control": f"public, max-age={RENDITION_MAX_AGE}",
+        # The format is negotiated from Accept unless ?format= is given
+        "Vary": "Accept",
+        "X-Cache": source,
+    }
+    if rendition.etag:
+        headers["ETag"] = rendition.etag
+        if req.headers.get("If-None-Match") == rendition.etag:
+            return func.HttpResponse(status_code=304, headers=headers)
+    return func.HttpResponse(rendition.data, mimetype=rendition.content_type, status_code=200, headers=headers)
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        size = int(req.route_params.get("size"))
+        filename = req.route_params.get("filename")
+
+        if size not in ONDEMAND_SIZES:
+            return func.HttpResponse(f"Size must be one of {sorted(ONDEMAND_SIZES)}", status_code=400)
+        if os.path.splitext(filename)[1].lower() not in SOURCE_FORMATS:
+            return func.HttpResponse("Only images allowed", status_code=400)
+
+        try:
+            params = {"sizes": str(size), "format": req.params.get("format")}
+            if req.params.get("profile"):
+                params["profile"] = req.params["profile"]
+            profile = build_profile(params, req.headers.get("Accept"))
+        except InvalidProfile as e:
+            return func.HttpResponse(f"Invalid rendition profile: {e}", status_code=400)
+
+        fmt = output_format(profile, filename)
+        if not req.params.get("format"):
+            # Only formats the client accepts; an explicit ?format= wins over Accept
+            fmt = negotiated_format(profile, filename, req.headers.get("Accept"))
+            if fmt is None:
+                return func.HttpResponse("No acceptable image format", status_code=406)
+            if fmt != output_format(profile, filename):
+                profile = dict(profile, format=fmt.lower())
+
+        # Blob path and cache key: includes the encoding, so profiles do not collide
+        path = rendition_path(size, output_name(filename, fmt), fmt, profile)
+
+        rendition = hot_renditions.get(path)
+        if rendition is not None:
+            return rendition_response(req, rendition, "memory")
+
+        (rendition, source), shared = in_flight.do(path, lambda: load_rendition(path, filename, size, profile))
+        if not shared:
+            hot_renditions.put(path, rendition)
+        return rendition_response(req, rendition, source + "-shared" if shared else source)
+
+    except ResourceNotFoundError:
+        return func.HttpResponse("Image not found", status_code=404)
+    except ImageTooLarge as e:
+        return func.HttpResponse(f"Image too large: {e}", status_code=413)
+    except Exception as e:
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
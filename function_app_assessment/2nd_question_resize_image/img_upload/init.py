@@ -1,9 +1,15 @@
 import azure.functions as func
+import base64
+import hashlib
+import io
 import os
 import json
-from azure.storage.blob import BlobServiceClient
-from azure.storage.queue import QueueClient
-from requests_toolbelt.multipart import decoder
+import uuid
+from datetime import datetime, timedelta, timezone
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+from multipart_stream import MultipartError, MultipartFileReader
+from rendition_profiles import InvalidProfile, build_profile
+from storage_clients import SasUnavailable, get_blob_service, get_container, get_queue, sas_signing_key
 
 ALLOWED = {".png", ".jpg", ".jpeg"}
 
@@ -11,68 +17,160 @@ def is_image(filename: str):
     ext = os.path.splitext(filename)[1].lower()
     return ext in ALLOWED
 
-# Use same storage account for everything
-BLOB_CONN_STRING = os.environ["AzureWebJobsStorage"]
 BLOB_CONTAINER = os.environ["BLOB_CONTAINER"]
 QUEUE_NAME = os.environ["QUEUE_NAME"]
+# Largest accepted upload, size of each staged block, lifetime of direct-upload URLs
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_BLOCK_BYTES = int(os.environ.get("UPLOAD_BLOCK_BYTES", str(4 * 1024 * 1024)))
+DIRECT_UPLOAD_TTL_MINUTES = int(os.environ.get("DIRECT_UPLOAD_TTL_MINUTES", "10"))
+
+
+class UploadTooLarge(Exception):
+    pass
 
-def enqueue_resize_message(blob_url: str):
-    queue = QueueClient.from_connection_string(BLOB_CONN_STRING, QUEUE_NAME)
-    try:
-        queue.create_queue()
-    except:
-        pass
 
+def enqueue_resize_message(blob_url: str, profile, content_hash=None):
     message = {
         "blobUrl": blob_url,
-        "sizes": [320, 1024]
+        "profile": profile
+    }
+    if content_hash:
+        # Lets the worker skip renditions that already exist for this content
+        message["contentHash"] = content_hash
+
+    get_queue(QUEUE_NAME).send_message(json.dumps(message))
+
+
+def stage_upload(blob, chunks):
+    """Stage chunks as blocks of UPLOAD_BLOCK_BYTES and commit them.
+    Returns (size, sha256 hex digest); nothing is committed for an empty file."""
+    block_ids = []
+    # Unique per upload: a concurrent or retried upload of the same name stages
+    # its own blocks instead of overwriting these (all ids are 40 characters)
+    upload_id = uuid.uuid4().hex
+    pending = bytearray()
+    total = 0
+    digest = hashlib.sha256()
+
+    def stage(data):
+        block_id = base64.b64encode(f"{upload_id}{len(block_ids):08d}".encode()).decode()
+        blob.stage_block(block_id, data)
+        block_ids.append(block_id)
+
+    for chunk in chunks:
+        total += len(chunk)
+        if total > UPLOAD_MAX_BYTES:
+            # Staged blocks are never committed; the service discards them
+            raise UploadTooLarge()
+        digest.update(chunk)
+        pending += chunk
+        while len(pending) >= UPLOAD_BLOCK_BYTES:
+            stage(bytes(pending[:UPLOAD_BLOCK_BYTES]))
+            del pending[:UPLOAD_BLOCK_BYTES]
+
+    if not total:
+        return 0, None
+    if pending:
+        stage(bytes(pending))
+    content_hash = digest.hexdigest()
+    blob.commit_block_list(block_ids, metadata={"contenthash": content_hash})
+    return total, content_hash
+
+
+def direct_upload_url(blob_service, filename):
+    """Short-lived SAS URL the client can PUT the file to, bypassing the function."""
+    expiry = datetime.now(timezone.utc) + timedelta(minutes=DIRECT_UPLOAD_TTL_MINUTES)
+    sas = generate_blob_sas(
+        account_name=blob_service.account_name,
+        container_name=BLOB_CONTAINER,
+        blob_name=filename,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=expiry,
+        **sas_signing_key(blob_service, expiry)
+    )
+    blob = blob_service.get_blob_client(BLOB_CONTAINER, filename)
+    return {
+        "uploadUrl": f"{blob.url}?{sas}",
+        "blobUrl": blob.url,
+        "expiresOn": expiry.isoformat(),
+        "headers": {"x-ms-blob-type": "BlockBlob"},
+        "maxBytes": UPLOAD_MAX_BYTES
     }
-
-    queue.send_message(json.dumps(message))
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        blob_service = BlobServiceClient.from_connection_string(BLOB_CONN_STRING)
-        container = blob_service.get_container_client(BLOB_CONTAINER)
+        # Clients are cached per worker; the container is created on first use only
+        blob_service = get_blob_service()
+        container = get_container(BLOB_CONTAINER)
+
+        mode = req.params.get("mode")
 
+        # Sizes, format, quality and metadata stripping for this upload's renditions
         try:
-            container.create_container()
-        except:
-            pass
+            profile = build_profile(req.params, req.headers.get("Accept"))
+        except InvalidProfile as e:
+            return func.HttpResponse(f"Invalid rendition profile: {e}", status_code=400)
+
+        # Direct mode: hand out a SAS URL; the client uploads, then calls mode=complete
+        if mode in ("direct", "complete"):
+            filename = req.params.get("filename")
+            if not filename or not is_image(filename):
+                return func.HttpResponse("Query parameter 'filename' must name an image", status_code=400)
+
+            if mode == "direct":
+                try:
+                    upload = direct_upload_url(blob_service, filename)
+                except SasUnavailable:
+                    return func.HttpResponse("Direct upload needs an account key or an Entra ID credential",
+                                             status_code=501)
+                return func.HttpResponse(json.dumps(upload), mimetype="application/json", status_code=200)
+
+            blob = container.get_blob_client(filename)
+            if not blob.exists():
+                return func.HttpResponse("Blob not uploaded yet", status_code=404)
+            if blob.get_blob_properties().size > UPLOAD_MAX_BYTES:
+                blob.delete_blob()
+                return func.HttpResponse("File too large", status_code=413)
+            # The client wrote this blob directly, so the worker hashes it itself
+            enqueue_resize_message(blob.url, profile)
+            return func.HttpResponse(f"Queued {filename}", status_code=200)
 
         content_type = req.headers.get('Content-Type', '')
 
         if "multipart/form-data" in content_type:
-            body = req.get_body()
-            multipart_data = decoder.MultipartDecoder(body, content_type)
-
-            filename = None
-            file_data = None
+            content_length = int(req.headers.get("Content-Length") or 0)
+            if content_length > UPLOAD_MAX_BYTES + 64 * 1024:
+                return func.HttpResponse("File too large", status_code=413)
 
-            for part in multipart_data.parts:
-                disp = part.headers.get(b"Content-Disposition", b"").decode()
-                if "filename=" in disp:
-                    filename = disp.split("filename=")[1].strip().replace('"', "")
-                    file_data = part.content
-                    break
+            # Parse the multipart stream incrementally and stage blocks as they arrive
+            reader = MultipartFileReader(io.BytesIO(req.get_body()), content_type)
+            filename = reader.next_file()
 
-            if not filename or not file_data:
+            if not filename:
                 return func.HttpResponse("No file found", status_code=400)
 
             if not is_image(filename):
                 return func.HttpResponse("Only images allowed", status_code=400)
 
             blob = container.get_blob_client(filename)
-            blob.upload_blob(file_data, overwrite=True)
+            try:
+                size, content_hash = stage_upload(blob, reader.iter_content())
+            except UploadTooLarge:
+                return func.HttpResponse("File too large", status_code=413)
+
+            if not size:
+                return func.HttpResponse("No file found", status_code=400)
 
             blob_url = blob.url
 
-            enqueue_resize_message(blob_url)
+            enqueue_resize_message(blob_url, profile, content_hash)
 
             return func.HttpResponse(f"Uploaded {filename}\nQueue added", status_code=200)
 
         return func.HttpResponse("Expected multipart/form-data", status_code=400)
 
+    except MultipartError as e:
+        return func.HttpResponse(f"Invalid multipart body: {e}", status_code=400)
     except Exception as e:
         return func.HttpResponse(f"Error: {str(e)}", status_code=500)
@@ -0,0 +1,116 @@
+import re
+
+# Incremental multipart/form-data reader. It scans a file-like stream chunk by
+# chunk and hands back the first file part's content in pieces, so the upload
+# can be staged to blob storage without building a second copy of the body.
+
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+class MultipartError(ValueError):
+    """The body is not valid multipart/form-data."""
+
+
+def get_boundary(content_type):
+    m = BOUNDARY.search(content_type or "")
+    if not m:
+        raise MultipartError("Missing multipart boundary")
+    return m.group(1).encode()
+
+
+def _filename(headers):
+    for line in headers.split(b"\r\n"):
+        name, _, value = line.decode("utf-8", errors="replace").partition(":")
+        if name.strip().lower() == "content-disposition" and "filename=" in value:
+            return value.split("filename=")[1].strip().replace('"', "")
+    return None
+
+
+class MultipartFileReader:
+    """Find the first part with a filename in a multipart stream.
+
+    Usage:
+        reader = MultipartFileReader(stream, content_type)
+        filename = reader.next_file()          # None if there is no file part
+        for chunk in reader.iter_content():    # bytes, at most ~CHUNK_SIZE each
+            ...
+    """
+
+    def __init__(self, stream, content_type, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._delimiter = b"--" + get_boundary(content_type)
+        # Every delimiter after the first one is preceded by CRLF
+        self._part_end = b"\r\n" + self._delimiter
+        self._buf = bytearray()
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def _skip_to(self, needle):
+        """Discard everything up to and including needle. False if it never appears."""
+        while True:
+            idx = self._buf.find(needle)
+            if idx >= 0:
+                del self._buf[:idx + len(needle)]
+                return True
+            # Keep a tail in case the needle straddles two chunks
+            del self._buf[:max(0, len(self._buf) - len(needle) + 1)]
+            if not self._fill():
+                return False
+
+    def _read_headers(self):
+        while True:
+            idx = self._buf.find(b"\r\n\r\n")
+            if idx >= 0:
+                headers = bytes(self._buf[:idx])
+                del self._buf[:idx + 4]
+                return headers
+            if len(self._buf) > MAX_HEADER_BYTES:
+                raise MultipartError("Part headers too large")
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
+
+    def next_file(self):
+        """Advance to the next part that carries a filename and return the name."""
+        if not self._skip_to(self._delimiter):
+            return None
+        while True:
+            # After a delimiter: "--" closes the body, otherwise CRLF + headers follow
+            while len(self._buf) < 2 and self._fill():
+                pass
+            if self._buf[:2] == b"--":
+                return None
+            filename = _filename(self._read_headers())
+            if filename:
+                return filename
+            if not self._skip_to(self._part_end):
+                return None
+
+    def iter_content(self):
+        """Yield the current part's content up to the closing delimiter."""
+        needle = self._part_end
+        while True:
+            idx = self._buf.find(needle)
+            if idx >= 0:
+                if idx:
+                    yield bytes(self._buf[:idx])
+                del self._buf[:idx + len(needle)]
+                return
+            safe = len(self._buf) - len(needle) + 1
+            if safe > 0:
+                yield bytes(self._buf[:safe])
+                del self._buf[:safe]
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+
+# In-process tiers for the on-demand rendition endpoint (get_rendition):
+# a byte-bounded LRU of hot renditions, and single-flight so concurrent
+# requests for the same missing rendition wait for one render.
+
+Rendition = namedtuple("Rendition", ["data", "content_type", "etag"])
+
+
+class RenditionCache:
+    """LRU of Rendition objects bounded by the total size of their data."""
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, item):
+        if len(item.data) > self.max_item_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.data)
+            self._items[key] = item
+            self._bytes += len(item.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """Run fn once per key at a time; concurrent callers share its result or error."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (result, shared); shared is True for callers that waited on another."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+from storage_clients import SasUnavailable, sas_signing_key
+
+# Content-addressed index of finished renditions, kept in RESIZED_CONTAINER.
+# For every (content hash, size, variant) that has been rendered there is an
+# empty marker blob _index/<hash>/<size>.<variant> whose metadata names the
+# rendition blob. Rendition blobs carry the hash of their source and their
+# variant in metadata, so a rendition that was overwritten by different
+# content or a different encoding is never reused. The variant (rendition_profiles.variant_key) covers format, quality and
+# whether metadata was stripped.
+
+INDEX_PREFIX = "_index"
+HASH_KEY = "contenthash"
+VARIANT_KEY = "variant"
+PATH_KEY = "path"
+COPY_SAS_MINUTES = 5
+
+
+def index_path(content_hash, size, variant):
+    return f"{INDEX_PREFIX}/{content_hash}/{size}.{variant}"
+
+
+def _properties(blob):
+    try:
+        return blob.get_blob_properties()
+    except ResourceNotFoundError:
+        return None
+
+
+def rendition_metadata(content_hash, variant):
+    return {HASH_KEY: content_hash, VARIANT_KEY: variant}
+
+
+def _holds(props, content_hash, variant):
+    metadata = (props.metadata or {}) if props else {}
+    return all(metadata.get(k) == v for k, v in rendition_metadata(content_hash, variant).items())
+
+
+class RenditionIndex:
+    """Look up, reuse and record renditions by (content hash, size, variant)."""
+
+    def __init__(self, blob_service, container):
+        self._service = blob_service
+        self._container = container
+
+    def _blob(self, path):
+        return self._service.get_blob_client(self._container, path)
+
+    def _read_url(self, blob):
+        # Put Blob From URL needs a readable source, even within the same account
+        expiry = datetime.now(timezone.utc) + timedelta(minutes=COPY_SAS_MINUTES)
+        try:
+            signing_key = sas_signing_key(self._service, expiry)
+        except SasUnavailable:
+            # A SAS credential is already part of the client's URL
+            return blob.url
+        sas = generate_blob_sas(
+            account_name=self._service.account_name,
+            container_name=self._container,
+            blob_name=blob.blob_name,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry,
+            **signing_key
+        )
+        return f"{blob.url}?{sas}"
+
+    def lookup(self, content_hash, size, variant):
+        """(path, properties) of an existing rendition of this content, or None."""
+        marker = _properties(self._blob(index_path(content_hash, size, variant)))
+        path = (marker.metadata or {}).get(PATH_KEY) if marker else None
+        if not path:
+            return None
+        props = _properties(self._blob(path))
+        if not _holds(props, content_hash, variant):
+            return None
+        return path, props
+
+    def reuse(self, content_hash, size, variant, target_path):
+        """Make target_path hold this rendition without rendering it.
+
+        Returns (url, bytes) when the target already holds the rendition (a
+        redelivered job) or when an existing rendition of the same content
+        was copied there server-side; None when it has to be rendered.
+        """
+        target = self._blob(target_path)
+        existing = _properties(target)
+        if _holds(existing, content_hash, variant):
+            return target.url, existing.size
+
+        found = self.lookup(content_hash, size, variant)
+        if not found:
+            return None
+        source_path, props = found
+        target.upload_blob_from_url(self._read_url(self._blob(source_path)), overwrite=True,
+                                    metadata=props.metadata, content_settings=props.content_settings)
+        return target.url, props.size
+
+    def record(self, content_hash, size, variant, path):
+        self._blob(index_path(content_hash, size, variant)).upload_blob(
+            b"", overwrite=True, metadata={PATH_KEY: path})
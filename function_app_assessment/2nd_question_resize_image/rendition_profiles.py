@@ -0,0 +1,179 @@
+import os
+from PIL import Image, features
+
+# Rendition profiles carried in the resize job message:
+#   {"sizes": [320, 1024], "format": "webp", "quality": 80, "stripMetadata": true}
+# img_upload builds one from a named profile, query overrides and the Accept
+# header; the worker resolves it to a concrete Pillow format per source file.
+
+RENDITION_QUALITY = int(os.environ.get("RENDITION_QUALITY", "80"))
+MAX_RENDITION_SIZE = int(os.environ.get("MAX_RENDITION_SIZE", "4096"))
+MAX_RENDITIONS = 8
+
+PROFILES = {
+    "default": {"sizes": [320, 1024], "format": "auto", "quality": RENDITION_QUALITY, "stripMetadata": True},
+    "thumbnail": {"sizes": [160, 320], "format": "auto", "quality": 70, "stripMetadata": True},
+    # Same output as before profiles existed: source format, Pillow's default quality, metadata kept
+    "original": {"sizes": [320, 1024], "format": "source", "quality": None, "stripMetadata": False},
+}
+# Renditions of messages from before profiles existed ("sizes" only)
+LEGACY_PROFILE = {"format": "source", "quality": None, "stripMetadata": False}
+
+# "auto" keeps JPEG sources as JPEG and turns everything else (PNG photos) into WebP;
+# "source" re-saves in the source format
+FORMATS = {"jpeg": "JPEG", "jpg": "JPEG", "png": "PNG", "webp": "WEBP", "avif": "AVIF"}
+SOURCE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "AVIF": ".avif"}
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "AVIF": "image/avif"}
+
+
+class InvalidProfile(ValueError):
+    pass
+
+
+def supports(fmt):
+    """Whether this Pillow build can write fmt (AVIF needs libavif)."""
+    if fmt == "AVIF":
+        return features.check("avif") or False
+    Image.init()
+    return fmt in Image.SAVE
+
+
+def negotiate_format(accept):
+    """Best output format the client's Accept header allows, or None."""
+    accept = (accept or "").lower()
+    if "image/avif" in accept and supports("AVIF"):
+        return "avif"
+    if "image/webp" in accept and supports("WEBP"):
+        return "webp"
+    return None
+
+
+def _sizes(value):
+    if isinstance(value, str):
+        value = [v for v in value.split(",") if v.strip()]
+    try:
+        sizes = sorted({int(v) for v in value})
+    except (TypeError, ValueError):
+        raise InvalidProfile("sizes must be a list of integers") from None
+    if not sizes or len(sizes) > MAX_RENDITIONS:
+        raise InvalidProfile(f"sizes must list 1 to {MAX_RENDITIONS} sizes")
+    if sizes[0] < 1 or sizes[-1] > MAX_RENDITION_SIZE:
+        raise InvalidProfile(f"sizes must be between 1 and {MAX_RENDITION_SIZE}")
+    return sizes
+
+
+def validate_profile(profile):
+    """Return a normalized copy of profile, raising InvalidProfile when it is unusable."""
+    fmt = str(profile.get("format", "auto")).lower()
+    if fmt not in FORMATS and fmt not in ("auto", "source"):
+        raise InvalidProfile(f"Unsupported format '{fmt}'")
+    # None: the encoder's default quality (the legacy output)
+    quality = profile.get("quality", RENDITION_QUALITY)
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except (TypeError, ValueError):
+            raise InvalidProfile("quality must be an integer") from None
+        if not 1 <= quality <= 100:
+            raise InvalidProfile("quality must be between 1 and 100")
+    strip = profile.get("stripMetadata", True)
+    if isinstance(strip, str):
+        strip = strip.lower() not in ("0", "false", "no")
+    return {"sizes": _sizes(profile.get("sizes")), "format": fmt,
+            "quality": quality, "stripMetadata": bool(strip)}
+
+
+def build_profile(params, accept=None):
+    """Profile for an upload: ?profile= picks the base, then sizes/format/quality/strip
+    query parameters override it. Without ?format=, the Accept header is negotiated."""
+    name = params.get("profile", "default")
+    if name not in PROFILES:
+        raise InvalidProfile(f"Unknown profile '{name}'")
+    profile = dict(PROFILES[name])
+    for key, param in (("sizes", "sizes"), ("format", "format"),
+                       ("quality", "quality"), ("stripMetadata", "strip")):
+        if params.get(param):
+            profile[key] = params[param]
+    if not params.get("format") and profile["format"] == "auto":
+        profile["format"] = negotiate_format(accept) or "auto"
+    return validate_profile(profile)
+
+
+def output_format(profile, filename):
+    """Pillow format name the renditions of filename are written in."""
+    source = SOURCE_FORMATS.get(os.path.splitext(filename)[1].lower(), "PNG")
+    fmt = profile["format"]
+    if fmt == "source" or (fmt == "auto" and source == "JPEG"):
+        return source
+    fmt = "WEBP" if fmt == "auto" else FORMATS[fmt]
+    # A worker without libavif (or libwebp) still has to produce something: WebP, else the source format
+    if supports(fmt):
+        return fmt
+    return "WEBP" if supports("WEBP") else source
+
+
+def output_name(filename, fmt):
+    """Rendition blob name: the source name, with the extension swapped when the format changes."""
+    stem, ext = os.path.splitext(filename)
+    if SOURCE_FORMATS.get(ext.lower()) == fmt:
+        return filename
+    return stem + EXTENSIONS[fmt]
+
+
+def variant_key(fmt, profile):
+    """Distinguishes renditions of the same size that were encoded differently."""
+    key = fmt.lower() if profile["quality"] is None else f"{fmt.lower()}-q{profile['quality']}"
+    return key + "-strip" if profile["stripMetadata"] else key
+
+
+def is_legacy(profile):
+    """Whether profile produces the output from before profiles existed."""
+    return all(profile[key] == value for key, value in LEGACY_PROFILE.items())
+
+
+def rendition_path(size, name, fmt, profile):
+    """Blob path of a rendition in RESIZED_CONTAINER. The legacy output keeps
+    its <size>/<filename> path; every other encoding gets a variant segment,
+    so profiles that encode the same size differently do not overwrite each other."""
+    if is_legacy(profile):
+        return f"{size}/{name}"
+    return f"{size}/{variant_key(fmt, profile)}/{name}"
+
+
+def accepts(accept, fmt):
+    """Whether an Accept header allows fmt: its most specific matching media
+    range decides, and q=0 excludes. No header accepts everything."""
+    if not accept:
+        return True
+    mime = MIME_TYPES[fmt]
+    ranges = {mime: 2, mime.split("/")[0] + "/*": 1, "*/*": 0}
+    best = None
+    for part in accept.lower().split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        if media not in ranges:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    pass
+        if best is None or ranges[media] > best[0]:
+            best = (ranges[media], q)
+    return best is not None and best[1] > 0
+
+
+def negotiated_format(profile, filename, accept):
+    """output_format when the Accept header allows it, else the source format
+    or another format the client accepts and this worker can write. None when
+    there is no such format."""
+    fmt = output_format(profile, filename)
+    if accepts(accept, fmt):
+        return fmt
+    source = SOURCE_FORMATS.get(os.path.splitext(filename)[1].lower(), "PNG")
+    for candidate in dict.fromkeys((source, "JPEG", "PNG", "WEBP", "AVIF")):
+        if accepts(accept, candidate) and supports(candidate):
+            return candidate
+    return None
@@ -0,0 +1,107 @@
+import os
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# Resize logic shared by the queue worker (auto_resize_image).
+# The source is decoded once, at the smallest scale that still covers the
+# largest requested size, and each smaller rendition is resampled from the
+# previous one instead of from the full-resolution original.
+
+MAX_INPUT_PIXELS = int(os.environ.get("MAX_INPUT_PIXELS", str(50_000_000)))
+MAX_INPUT_BYTES = int(os.environ.get("MAX_INPUT_BYTES", str(50 * 1024 * 1024)))
+
+# Pillow's own decompression-bomb guard; ours is checked first with a clearer error
+Image.MAX_IMAGE_PIXELS = max(MAX_INPUT_PIXELS, Image.MAX_IMAGE_PIXELS or 0)
+
+
+class ImageTooLarge(Exception):
+    """The input exceeds MAX_INPUT_BYTES or MAX_INPUT_PIXELS."""
+
+
+def fit_within(width, height, size):
+    """Same box fit as Image.thumbnail: keep aspect ratio, never upscale."""
+    if width <= size and height <= size:
+        return width, height
+    if width >= height:
+        return size, max(1, round(height * size / width))
+    return max(1, round(width * size / height)), size
+
+
+def open_image(data, largest_size):
+    """Open an image for rendering renditions up to largest_size pixels.
+
+    Only the header is read before the size checks. JPEGs are then decoded in
+    draft mode, letting libjpeg scale by 1/2, 1/4 or 1/8 during decoding.
+    """
+    if len(data) > MAX_INPUT_BYTES:
+        raise ImageTooLarge(f"{len(data)} bytes exceeds the {MAX_INPUT_BYTES} byte limit")
+
+    img = Image.open(BytesIO(data))
+    width, height = img.size
+    if width * height > MAX_INPUT_PIXELS:
+        raise ImageTooLarge(f"{width}x{height} exceeds the {MAX_INPUT_PIXELS} pixel limit")
+
+    if img.format == "JPEG":
+        img.draft(img.mode, fit_within(width, height, largest_size))
+    img.load()
+    return img
+
+
+def iter_renditions(img, sizes):
+    """Yield (size, Image) from the largest size down, each one resampled
+    from the previous (next larger) rendition."""
+    current = img
+    for size in sorted(set(sizes), reverse=True):
+        target = fit_within(current.width, current.height, size)
+        if target != current.size:
+            current = current.resize(target, Image.LANCZOS, reducing_gap=3.0)
+        yield size, current
+
+
+def render_sizes(img, sizes):
+    """Return {size: Image} for every requested size."""
+    return dict(iter_renditions(img, sizes))
+
+
+def _flatten(img):
+    """JPEG has no alpha channel: composite transparent images onto white."""
+    if img.mode in ("RGB", "L"):
+        return img
+    img = img.convert("RGBA")
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A"))
+    return background
+
+
+def encode(img, fmt, quality=None, strip_metadata=False):
+    """Encode img as fmt. strip_metadata bakes the EXIF orientation into the
+    pixels and drops EXIF/XMP; the ICC profile is always kept for colour."""
+    options = {}
+    if strip_metadata:
+        img = ImageOps.exif_transpose(img)
+    elif img.info.get("exif"):
+        options["exif"] = img.info["exif"]
+    if img.info.get("icc_profile"):
+        options["icc_profile"] = img.info["icc_profile"]
+
+    if fmt == "JPEG":
+        img = _flatten(img)
+        options.update(optimize=True, progressive=True)
+    elif fmt in ("WEBP", "AVIF"):
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+        if fmt == "WEBP":
+            options["method"] = 4
+    if quality is not None and fmt != "PNG":
+        options["quality"] = quality
+
+    buf = BytesIO()
+    img.save(buf, format=fmt, **options)
+    return buf.getvalue()
+
+
+def resize_bytes(data, sizes):
+    """Decode data once and return {size: encoded bytes} in the source format."""
+    img = open_image(data, max(sizes))
+    fmt = img.format or "PNG"
+    return {size: encode(rendition, fmt) for size, rendition in render_sizes(img, sizes).items()}
@@ -0,0 +1,195 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from azure.core.exceptions import AzureError
+from azure.storage.blob import ContentSettings
+from rendition_index import RenditionIndex, rendition_metadata
+from rendition_profiles import (LEGACY_PROFILE, MIME_TYPES, InvalidProfile, output_format, output_name,
+                                rendition_path, validate_profile, variant_key)
+from resize_engine import ImageTooLarge, encode, iter_renditions, open_image
+from storage_clients import get_blob_service, get_container
+
+# One resize job (a queue message) end to end. Shared by the queue trigger
+# (auto_resize_image) and the batch drainer (drain_resize_queue).
+
+BLOB_CONTAINER = os.environ["BLOB_CONTAINER"]
+RESIZED_CONTAINER = os.environ["RESIZED_CONTAINER"]
+# Renditions encoded/uploaded at the same time, and upload attempts per rendition
+RESIZE_MAX_IN_FLIGHT = int(os.environ.get("RESIZE_MAX_IN_FLIGHT", "4"))
+RENDITION_MAX_ATTEMPTS = int(os.environ.get("RENDITION_MAX_ATTEMPTS", "3"))
+
+# Module-level so the HTTP connection pool and worker threads are reused across messages
+blob_service = get_blob_service()
+rendition_pool = ThreadPoolExecutor(max_workers=RESIZE_MAX_IN_FLIGHT)
+rendition_index = RenditionIndex(blob_service, RESIZED_CONTAINER)
+
+
+class InvalidJob(ValueError):
+    """The message can never be processed; retrying it is pointless."""
+
+
+def parse_job(body):
+    """Decode a queue message body (raw or base64 JSON) into a job dict with
+    a validated job["profile"]. Messages from before profiles existed carry
+    only "sizes" and keep their old output: source format, metadata kept."""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        job = json.loads(body)
+    except ValueError:
+        try:
+            job = json.loads(base64.b64decode(body, validate=True))
+        except ValueError:
+            raise InvalidJob("Message is not JSON") from None
+    if not isinstance(job, dict) or not job.get("blobUrl"):
+        raise InvalidJob("Message needs blobUrl")
+
+    profile = job.get("profile")
+    if profile is None:
+        profile = dict(LEGACY_PROFILE, sizes=job.get("sizes"))
+    try:
+        job["profile"] = validate_profile(profile)
+    except InvalidProfile as e:
+        raise InvalidJob(str(e)) from None
+    return job
+
+
+def store_rendition(path, size, data, fmt, variant, content_hash):
+    """Upload encoded rendition bytes and record them in the rendition index,
+    retrying on failure. Returns the blob's ETag."""
+    out_blob = blob_service.get_blob_client(RESIZED_CONTAINER, path)
+
+    for attempt in range(1, RENDITION_MAX_ATTEMPTS + 1):
+        try:
+            result = out_blob.upload_blob(data, overwrite=True,
+                                          metadata=rendition_metadata(content_hash, variant),
+                                          content_settings=ContentSettings(content_type=MIME_TYPES[fmt]))
+            rendition_index.record(content_hash, size, variant, path)
+            return result.get("etag")
+        except AzureError as e:
+            if attempt == RENDITION_MAX_ATTEMPTS:
+                raise
+            print(f"Upload of {path} failed (attempt {attempt}): {e}")
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+
+def publish_rendition(name, size, rendition, fmt, profile, content_hash):
+    """Encode one rendition and store it, retrying only this rendition on
+    failure. Returns (url, encoded bytes)."""
+    data = encode(rendition, fmt, profile["quality"], profile["stripMetadata"])
+    path = rendition_path(size, name, fmt, profile)
+    store_rendition(path, size, data, fmt, variant_key(fmt, profile), content_hash)
+    return blob_service.get_blob_client(RESIZED_CONTAINER, path).url, len(data)
+
+
+def render_rendition(filename, size, profile):
+    """Render a single size of filename right now, for the on-demand endpoint.
+    Stores it where the queue worker would. Returns (path, data, content type, etag).
+    Raises ResourceNotFoundError when the source does not exist."""
+    fmt = output_format(profile, filename)
+    variant = variant_key(fmt, profile)
+    path = rendition_path(size, output_name(filename, fmt), fmt, profile)
+
+    original_bytes = blob_service.get_blob_client(BLOB_CONTAINER, filename).download_blob().readall()
+    content_hash = hashlib.sha256(original_bytes).hexdigest()
+    img = open_image(original_bytes, size)
+    _, rendition = next(iter_renditions(img, [size]))
+    data = encode(rendition, fmt, profile["quality"], profile["stripMetadata"])
+
+    get_container(RESIZED_CONTAINER)
+    etag = store_rendition(path, size, data, fmt, variant, content_hash)
+    return path, data, MIME_TYPES[fmt], etag
+
+
+def reuse_renditions(name, sizes, content_hash, fmt, profile):
+    """Split sizes into ({size: (url, bytes)} already in place, [sizes still to render])."""
+    variant = variant_key(fmt, profile)
+    done, missing = {}, []
+    for size in sizes:
+        found = rendition_index.reuse(content_hash, size, variant, rendition_path(size, name, fmt, profile))
+        if found:
+            done[size] = found
+        else:
+            missing.append(size)
+    return done, missing
+
+
+def log_renditions(filename, fmt, source_bytes, outputs, reused):
+    """One structured line per job so output sizes (and savings) can be queried."""
+    print(json.dumps({
+        "event": "renditions",
+        "file": filename,
+        "format": fmt,
+        "sourceBytes": source_bytes,
+        "renditions": [
+            {"size": size, "url": url, "bytes": nbytes, "reused": size in reused}
+            for size, (url, nbytes) in sorted(outputs.items())
+        ],
+    }))
+
+
+def process_job(job):
+    """Render every size in the job's profile, reusing existing renditions.
+    Raises when a rendition could not be published so the job is retried."""
+    profile = job["profile"]
+    content_hash = job.get("contentHash")
+
+    filename = job["blobUrl"].split("/")[-1]
+    fmt = output_format(profile, filename)
+    name = output_name(filename, fmt)
+
+    src_blob = blob_service.get_blob_client(BLOB_CONTAINER, filename)
+    original_bytes = None
+    if content_hash and (src_blob.get_blob_properties().metadata or {}).get("contenthash") != content_hash:
+        # The original was overwritten after this message was sent: its hash is stale
+        content_hash = None
+    if not content_hash:
+        # Direct uploads and older messages carry no hash; hash the download instead
+        original_bytes = src_blob.download_blob().readall()
+        content_hash = hashlib.sha256(original_bytes).hexdigest()
+
+    # Redelivered jobs and duplicate uploads find their renditions in the index
+    outputs, missing = reuse_renditions(name, profile["sizes"], content_hash, fmt, profile)
+    if missing and original_bytes is None:
+        original_bytes = src_blob.download_blob().readall()
+        downloaded_hash = hashlib.sha256(original_bytes).hexdigest()
+        if downloaded_hash != content_hash:
+            # Overwritten between the metadata check and the download: index what was downloaded
+            content_hash = downloaded_hash
+            outputs, missing = reuse_renditions(name, profile["sizes"], content_hash, fmt, profile)
+    reused = set(outputs)
+    if not missing:
+        log_renditions(filename, fmt, None, outputs, reused)
+        return
+
+    # Creates RESIZED_CONTAINER on the first render of this process only
+    get_container(RESIZED_CONTAINER)
+
+    # Decode once (reduced-size for JPEG) and cascade from largest to smallest size
+    try:
+        img = open_image(original_bytes, max(missing))
+    except ImageTooLarge as e:
+        print(f"Skipping {filename}: {e}")
+        return
+
+    # Each rendition is encoded + uploaded on the pool while the next one is resized
+    futures = {
+        size: rendition_pool.submit(publish_rendition, name, size, rendition, fmt, profile, content_hash)
+        for size, rendition in iter_renditions(img, missing)
+    }
+
+    failed = {}
+    for size, future in futures.items():
+        try:
+            outputs[size] = future.result()
+        except Exception as e:
+            failed[size] = e
+
+    log_renditions(filename, fmt, len(original_bytes), outputs, reused)
+
+    if failed:
+        # Raising lets the queue redeliver the job
+        raise RuntimeError(f"Renditions failed for {filename}: {failed}")
@@ -0,0 +1,102 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import BlobServiceClient
+from azure.storage.queue import QueueClient
+
+# One BlobServiceClient and one QueueClient per queue for the whole worker
+# process. Containers and queues are created on first use only; later calls
+# reuse the cached client without another control-plane request.
+
+# Use the same storage account as everything
+BLOB_CONN_STRING = os.environ["AzureWebJobsStorage"]
+# AzureWebJobsStorage=memory:// swaps storage for the in-memory fake_blob stand-in
+USE_FAKE_STORAGE = BLOB_CONN_STRING.startswith("memory://")
+
+_lock = threading.Lock()
+_blob_service = None
+_containers = {}
+_queues = {}
+_delegation_key = None
+
+
+class SasUnavailable(Exception):
+    """The storage credential cannot sign a SAS (e.g. the connection string itself is a SAS)."""
+
+
+def get_blob_service():
+    global _blob_service
+    if _blob_service is None:
+        with _lock:
+            if _blob_service is None:
+                if USE_FAKE_STORAGE:
+                    import fake_blob
+                    _blob_service = fake_blob.blob_service_client()
+                else:
+                    _blob_service = BlobServiceClient.from_connection_string(BLOB_CONN_STRING)
+    return _blob_service
+
+
+def get_container(name):
+    """ContainerClient for name, creating the container once per process."""
+    container = _containers.get(name)
+    if container is None:
+        # Outside the lock: get_blob_service takes it too
+        blob_service = get_blob_service()
+        with _lock:
+            container = _containers.get(name)
+            if container is None:
+                container = blob_service.get_container_client(name)
+                try:
+                    container.create_container()
+                except ResourceExistsError:
+                    pass
+                _containers[name] = container
+    return container
+
+
+def get_queue(name):
+    """QueueClient for name, creating the queue once per process."""
+    queue = _queues.get(name)
+    if queue is None:
+        with _lock:
+            queue = _queues.get(name)
+            if queue is None:
+                if USE_FAKE_STORAGE:
+                    import fake_blob
+                    queue = fake_blob.queue_client(name)
+                else:
+                    queue = QueueClient.from_connection_string(BLOB_CONN_STRING, name)
+                try:
+                    queue.create_queue()
+                except ResourceExistsError:
+                    pass
+                _queues[name] = queue
+    return queue
+
+
+def _user_delegation_key(blob_service, expiry):
+    """User delegation key valid until at least expiry; one per worker, renewed
+    when it would run out (keys last up to 7 days, one is requested per day)."""
+    global _delegation_key
+    with _lock:
+        if _delegation_key is None or _delegation_key[1] < expiry:
+            now = datetime.now(timezone.utc)
+            key_expiry = max(expiry, now + timedelta(days=1))
+            key = blob_service.get_user_delegation_key(now - timedelta(minutes=5), key_expiry)
+            _delegation_key = (key, key_expiry)
+        return _delegation_key[0]
+
+
+def sas_signing_key(blob_service, expiry):
+    """generate_blob_sas arguments for the service's credential: the account
+    key, or a user delegation key for an Entra ID (managed identity) credential.
+    Raises SasUnavailable for any other credential."""
+    credential = blob_service.credential
+    account_key = getattr(credential, "account_key", None)
+    if account_key:
+        return {"account_key": account_key}
+    if hasattr(credential, "get_token"):
+        return {"user_delegation_key": _user_delegation_key(blob_service, expiry)}
+    raise SasUnavailable()
@@ -0,0 +1,161 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from extractors import EXTRACTORS, ExtractionLimitExceeded
+from index_store import DOWNLOAD_CHUNK_BYTES, get_blob_service
+
+# Runs an extractor over a blob's download. Small blobs of light formats are
+# extracted inline on the calling index_pool thread. Large blobs and heavy
+# formats (JSON lines, gzip) go to a pool of worker processes, so CPU-bound
+# parsing runs in parallel and one huge file does not hold the GIL for the
+# whole batch. A worker downloads the blob itself and parses one chunk while
+# the next ones download in a background thread.
+#
+# Limits per document: EXTRACT_TIMEOUT_SECONDS of wall time, and in the
+# process pool EXTRACT_MEMORY_MB of address space per worker (one document at
+# a time). A document over a limit fails extraction and is indexed without
+# title, word count and terms, like any other unreadable blob.
+
+# Worker processes for large and heavy documents
+EXTRACT_PROCESSES = int(os.environ.get("EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+# Blobs up to this size (of a light format) are extracted inline
+INLINE_EXTRACT_MAX_BYTES = int(os.environ.get("INLINE_EXTRACT_MAX_BYTES", str(8 * 1024 * 1024)))
+EXTRACT_TIMEOUT_SECONDS = float(os.environ.get("EXTRACT_TIMEOUT_SECONDS", "300"))
+EXTRACT_MEMORY_MB = int(os.environ.get("EXTRACT_MEMORY_MB", "2048"))
+# Worker processes are replaced after this many documents, returning their memory
+EXTRACT_TASKS_PER_PROCESS = int(os.environ.get("EXTRACT_TASKS_PER_PROCESS", "100"))
+# Downloaded chunks buffered ahead of the parser
+PREFETCH_CHUNKS = 2
+
+_lock = threading.Lock()
+_process_pool = None
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def _prefetch(chunks, deadline):
+    """Yield chunks downloaded by a background thread, at most PREFETCH_CHUNKS ahead."""
+    buffer = queue.Queue(maxsize=PREFETCH_CHUNKS)
+    stop = threading.Event()
+    done = object()
+
+    def download():
+        try:
+            for chunk in chunks:
+                while not stop.is_set():
+                    try:
+                        buffer.put(chunk, timeout=1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            buffer.put(done)
+        except Exception as e:
+            buffer.put(e)
+
+    threading.Thread(target=download, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = buffer.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise ExtractionTimeout(f"no data within {EXTRACT_TIMEOUT_SECONDS} s") from None
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def _within(chunks, deadline):
+    for chunk in chunks:
+        if time.monotonic() > deadline:
+            raise ExtractionTimeout(f"extraction took longer than {EXTRACT_TIMEOUT_SECONDS} s")
+        yield chunk
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout(f"extraction took longer than {EXTRACT_TIMEOUT_SECONDS} s")
+
+
+def extract_blob(container_name, blob_name, extractor_name, size):
+    """Download a blob and run one extractor over it. Runs inline or in a worker process."""
+    deadline = time.monotonic() + EXTRACT_TIMEOUT_SECONDS
+    in_worker = multiprocessing.parent_process() is not None and threading.current_thread() is threading.main_thread()
+    if in_worker and hasattr(signal, "setitimer"):
+        # Hard limit: also interrupts an extractor stuck inside a single chunk
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, EXTRACT_TIMEOUT_SECONDS)
+    try:
+        blob_client = get_blob_service().get_blob_client(container=container_name, blob=blob_name)
+        chunks = blob_client.download_blob().chunks()
+        if size > DOWNLOAD_CHUNK_BYTES:
+            # Overlap the download of the next chunks with parsing this one
+            chunks = _prefetch(chunks, deadline)
+        return EXTRACTORS[extractor_name].extract(_within(chunks, deadline), blob_name)
+    except MemoryError:
+        if not in_worker:
+            raise
+        raise ExtractionLimitExceeded(f"over the {EXTRACT_MEMORY_MB} MB memory limit") from None
+    finally:
+        if in_worker and hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _limit_worker():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    limit = EXTRACT_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        with _lock:
+            if _process_pool is None:
+                # spawn: workers open their own storage connections instead of sharing forked sockets
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_limit_worker, max_tasks_per_child=EXTRACT_TASKS_PER_PROCESS
+                )
+    return _process_pool
+
+
+def _reset_process_pool(pool):
+    global _process_pool
+    with _lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=False)
+
+
+def extract(container_name, blob_name, extractor, size):
+    """Extraction for a blob, inline or in the process pool. Raises on failure,
+    timeout or limit."""
+    if not extractor.heavy and size <= INLINE_EXTRACT_MAX_BYTES:
+        return extract_blob(container_name, blob_name, extractor.name, size)
+
+    pool = get_process_pool()
+    future = pool.submit(extract_blob, container_name, blob_name, extractor.name, size)
+    try:
+        # The worker stops itself at the time limit; the margin covers start-up and result transfer
+        return future.result(timeout=EXTRACT_TIMEOUT_SECONDS + 30)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): later documents get a fresh pool
+        logging.error(f"Extraction worker for {blob_name} died; restarting the process pool.")
+        _reset_process_pool(pool)
+        raise
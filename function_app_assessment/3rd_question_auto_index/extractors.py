@@ -0,0 +1,175 @@
+import codecs
+import json
+import os
+import zlib
+from collections import namedtuple
+from term_index import INDEX_MAX_TERMS
+from text_stats import TextStats
+
+# Content extractors, keyed by content type (and file extension for blobs
+# stored as application/octet-stream). Each one turns an iterator of byte
+# chunks into an Extraction. Adding a format is one decorated function:
+#
+#   @register("html", content_types=("text/html",), extensions=(".html",))
+#   def extract_html(chunks, blob_name): ...
+#
+# heavy=True marks extractors that always run in the extraction process pool
+# (extraction.py); the others only go there for large blobs.
+
+# Decompressed bytes allowed per gzip blob (bounds a compression bomb)
+MAX_DECOMPRESSED_BYTES = int(os.environ.get("MAX_DECOMPRESSED_BYTES", str(2 * 1024 ** 3)))
+# Decompressed bytes produced per step, so one compressed chunk cannot expand in memory at once
+GUNZIP_BLOCK_BYTES = 4 * 1024 * 1024
+# Longest JSON line parsed; longer records are skipped
+MAX_JSON_LINE_CHARS = 16 * 1024 * 1024
+# Keys whose string value titles a JSON lines document
+JSON_TITLE_KEYS = ("title", "name", "subject")
+
+Extraction = namedtuple("Extraction", "title word_count terms term_count")
+Extractor = namedtuple("Extractor", "name content_types extensions heavy extract")
+
+EXTRACTORS = {}
+
+
+class ExtractionLimitExceeded(Exception):
+    pass
+
+
+def register(name, content_types=(), extensions=(), heavy=False):
+    def decorator(extract):
+        EXTRACTORS[name] = Extractor(name, tuple(content_types), tuple(extensions), heavy, extract)
+        return extract
+    return decorator
+
+
+def find_extractor(blob_name, content_type):
+    """Extractor for a blob: exact content type first, then file extension,
+    then plain text for any other text/* type. None if nothing applies."""
+    mime = (content_type or "").split(";")[0].strip().lower()
+    for extractor in EXTRACTORS.values():
+        if mime in extractor.content_types:
+            return extractor
+    name = blob_name.lower()
+    for extractor in EXTRACTORS.values():
+        if name.endswith(extractor.extensions):
+            return extractor
+    if mime.startswith("text/"):
+        return EXTRACTORS["text"]
+    return None
+
+
+def _result(stats):
+    title, word_count = stats.finish()
+    return Extraction(title, word_count, stats.terms.top(INDEX_MAX_TERMS), stats.terms.length)
+
+
+@register("text", content_types=("text/plain",), extensions=(".txt", ".log"))
+def extract_text(chunks, blob_name):
+    stats = TextStats(count_terms=True)
+    for chunk in chunks:
+        stats.feed(chunk)
+    return _result(stats)
+
+
+@register("markdown", content_types=("text/markdown", "text/x-markdown"), extensions=(".md", ".markdown"))
+def extract_markdown(chunks, blob_name):
+    # The "# " heading rule in TextStats is the Markdown title
+    return extract_text(chunks, blob_name)
+
+
+@register("csv", content_types=("text/csv",), extensions=(".csv",))
+def extract_csv(chunks, blob_name):
+    """Title is the header row; words and terms are the cell values."""
+    stats = TextStats(title_scan_max_lines=1, count_terms=True)
+    for chunk in chunks:
+        # Separate the cells ("a,b" is two words); "," is one byte in UTF-8
+        stats.feed(chunk.replace(b",", b", "))
+    return _result(stats)
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def _lines(chunks):
+    """Decoded lines of a byte stream; over-long lines come back as None."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    line = ""
+    for chunk in chunks:
+        parts = (line + decoder.decode(chunk)).split("\n")
+        line = parts.pop()
+        yield from parts
+        if len(line) > MAX_JSON_LINE_CHARS:
+            line = ""
+            yield None
+    line += decoder.decode(b"", final=True)
+    if line:
+        yield line
+
+
+@register("jsonl", content_types=("application/x-ndjson", "application/jsonl", "application/x-jsonlines"),
+          extensions=(".jsonl", ".ndjson"), heavy=True)
+def extract_jsonl(chunks, blob_name):
+    """Words and terms of every string value. Title is the first record's
+    title/name/subject, else its first string value."""
+    stats = TextStats(title_scan_max_lines=1, count_terms=True)
+    first = True
+    for line in _lines(chunks):
+        if not line or not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        strings = list(_strings(record))
+        if first and isinstance(record, dict):
+            # The first line fed is the title: move the title value to the front
+            # (once, so it is still counted once)
+            title = next((record[key] for key in JSON_TITLE_KEYS if isinstance(record.get(key), str)), None)
+            if title is not None:
+                strings.remove(title)
+                strings.insert(0, title)
+        first = False
+        # One line per value: a newline in a value must not end the title line early
+        stats.feed_text("".join(" ".join(value.split()) + "\n" for value in strings))
+    return _result(stats)
+
+
+def _gunzip(chunks):
+    """Decompress a gzip stream (several members allowed) block by block."""
+    decompressor = zlib.decompressobj(wbits=31)
+    total = 0
+    for data in chunks:
+        while data:
+            out = decompressor.decompress(data, GUNZIP_BLOCK_BYTES)
+            data = decompressor.unconsumed_tail
+            if decompressor.eof:
+                # Next gzip member, if any
+                data = decompressor.unused_data + data
+                decompressor = zlib.decompressobj(wbits=31)
+            total += len(out)
+            if total > MAX_DECOMPRESSED_BYTES:
+                raise ExtractionLimitExceeded(f"more than {MAX_DECOMPRESSED_BYTES} bytes decompressed")
+            if out:
+                yield out
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+@register("gzip", content_types=("application/gzip", "application/x-gzip"), extensions=(".gz",), heavy=True)
+def extract_gzip(chunks, blob_name):
+    """Decompress, then extract with the format of the inner name (notes.md.gz
+    is Markdown); plain text if it has none."""
+    inner_name = blob_name[:-3] if blob_name.lower().endswith(".gz") else blob_name
+    inner = find_extractor(inner_name, None)
+    if inner is None or inner.name == "gzip":
+        inner = EXTRACTORS["text"]
+    return inner.extract(_gunzip(chunks), inner_name)
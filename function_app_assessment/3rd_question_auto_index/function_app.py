@@ -1,12 +1,27 @@
+import base64
+import json
 import logging
 import os
+import time
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient, PartitionKey
-from datetime import datetime
+from azure.core.exceptions import AzureError
+from extraction import EXTRACT_TIMEOUT_SECONDS
+from index_store import get_queue
+from indexer import FAILED, apply_event, blob_changes, index_batch
+from term_index import search
 
 app = func.FunctionApp()
 
+# Optional storage queue fed by an Event Grid subscription; drained in batches
+INDEX_QUEUE_NAME = os.environ.get("INDEX_QUEUE_NAME")
+INDEX_QUEUE_BATCH = min(32, int(os.environ.get("INDEX_QUEUE_BATCH", "32")))
+INDEX_DRAIN_MAX_SECONDS = float(os.environ.get("INDEX_DRAIN_MAX_SECONDS", "240"))
+MAX_DEQUEUE_COUNT = int(os.environ.get("MAX_DEQUEUE_COUNT", "5"))
+# Received messages stay hidden through a full extraction plus the Cosmos write
+INDEX_QUEUE_VISIBILITY_TIMEOUT = int(os.environ.get(
+    "INDEX_QUEUE_VISIBILITY_TIMEOUT", str(int(EXTRACT_TIMEOUT_SECONDS) + 60)))
+SEARCH_MAX_RESULTS = 50
+
 
 @app.event_grid_trigger(arg_name="azeventgrid")
 def EventGridTrigger(azeventgrid: func.EventGridEvent):
@@ -18,110 +33,133 @@ def EventGridTrigger(azeventgrid: func.EventGridEvent):
         blob_url = data["url"]
         logging.info(f"Blob URL: {blob_url}")
 
-        #  CONNECT TO BLOB STG
-
-        blob_conn = os.environ["BLOB_CONN_STR"]
-        blob_service = BlobServiceClient.from_connection_string(blob_conn)
-
-        # container + blob name
-        parts = blob_url.replace("https://", "").split("/", 2)
-        container_name = parts[1]
-        blob_name = parts[2]
-        logging.info(f"Container: {container_name}, Blob: {blob_name}")
-
-        blob_client = blob_service.get_blob_client(container=container_name, blob=blob_name)
-
-        # Blob properties
-        props = blob_client.get_blob_properties()
+        apply_event(azeventgrid.event_type, blob_url)
 
-        size = props.size
-        content_type = props.content_settings.content_type
+    except Exception as e:
+        logging.error(f"Error: {e}")
+        raise
 
-        #  READ BLOB
+    return None
 
-        title = None
-        word_count = None
 
-        if "text" in content_type or blob_name.endswith(".txt") or blob_name.endswith(".md"):
-            try:
-                blob_bytes = blob_client.download_blob().readall()
-                blob_text = blob_bytes.decode("utf-8", errors="ignore")
-
-                # Extract title:
-
-                for line in blob_text.splitlines():
-                    stripped = line.strip()
-                    if stripped.startswith("# "):
-                        title = stripped[2:].strip()
-                        break
-
-                if not title and blob_text:
-                    title = blob_text.splitlines()[0].strip() or "(empty file)"
-                elif not title:
-                    title = "(empty file)"
-
-                # Count words
-                word_count = len(blob_text.split())
-
-            except Exception as e:
-                logging.error(f"Error reading blob content: {e}")
-                title = None
-                word_count = None
-        else:
-            logging.info("Blob is not a text file. Skipping content extraction.")
-
-        # COSMOS DB
-
-        document = {
-            "id": blob_name,
-            "blobName": blob_name,
-            "container": container_name,
-            "url": blob_url,
-            "size": size,
-            "contentType": content_type,
-            "title": title,
-            "wordCount": word_count,
-            "uploadedOn": datetime.utcnow().isoformat()
-        }
-
-        logging.info(f"Document to insert: {document}")
-
-        # INSERT TO COSMOS DB
-
-        cosmos_client = CosmosClient.from_connection_string(os.environ["COSMOS_CONN_STR"])
-        try:
-            cosmos_client.create_database_if_not_exists(os.environ["COSMOS_DB"])
-            logging.info("Database checked/created.")
-        except Exception as e:
-            logging.error(f"Error creating database: {e}")
-            raise
-
-        try:
-            cosmos_client.get_database_client(os.environ["COSMOS_DB"]).create_container_if_not_exists(
-                id=os.environ["COSMOS_CONTAINER"],
-                partition_key=PartitionKey(path="/id")
+def _validation_response(events):
+    """Event Grid webhook handshake, sent once when the subscription is created."""
+    for event in events:
+        if isinstance(event, dict) and event.get("eventType") == "Microsoft.EventGrid.SubscriptionValidationEvent":
+            return func.HttpResponse(
+                json.dumps({"validationResponse": (event.get("data") or {}).get("validationCode")}),
+                mimetype="application/json", status_code=200
             )
-            logging.info("Container checked/created.")
-        except Exception as e:
-            logging.error(f"Error creating container: {e}")
-            raise
-
-        database = cosmos_client.get_database_client(os.environ["COSMOS_DB"])
-        container = database.get_container_client(os.environ["COSMOS_CONTAINER"])
+    return None
 
-        try:
-            container.read_item(item=blob_name, partition_key=blob_name)
-            logging.info("Document already exists in Cosmos DB. Skipping insert.")
-            return None
-        except Exception:
-            pass
 
-        container.create_item(document)
+@app.route(route="eventgrid/batch", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.FUNCTION)
+def EventGridBatch(req: func.HttpRequest) -> func.HttpResponse:
+    """Webhook endpoint for an Event Grid subscription with batched delivery."""
+    if req.method == "OPTIONS":
+        # CloudEvents schema handshake
+        return func.HttpResponse(status_code=200, headers={
+            "WebHook-Allowed-Origin": req.headers.get("WebHook-Request-Origin", "*")
+        })
 
-        logging.info("Metadata inserted into Cosmos DB successfully.")
-
-    except Exception as e:
-        logging.error(f"Error: {e}")
-        raise
-
-    return None
\ No newline at end of file
+    try:
+        events = req.get_json()
+    except ValueError:
+        return func.HttpResponse("Body must be a JSON array of events", status_code=400)
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list):
+        return func.HttpResponse("Body must be a JSON array of events", status_code=400)
+
+    validation = _validation_response(events)
+    if validation:
+        return validation
+
+    results = index_batch(blob_changes(events))
+    summary = {str(status): list(results.values()).count(status) for status in set(results.values())}
+    logging.info(f"Indexed batch of {len(events)} events: {summary}")
+
+    # A non-2xx answer makes Event Grid redeliver the batch; indexed blobs then come back unchanged
+    status_code = 500 if FAILED in summary else 200
+    return func.HttpResponse(json.dumps(summary), mimetype="application/json", status_code=status_code)
+
+
+def _queue_events(content):
+    """Events in one queue message: Event Grid writes one event per message,
+    base64-encoded or as plain JSON."""
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        payload = json.loads(base64.b64decode(content))
+    return payload if isinstance(payload, list) else [payload]
+
+
+@app.timer_trigger(schedule="*/10 * * * * *", arg_name="timer", run_on_startup=False)
+def IndexQueueDrain(timer: func.TimerRequest) -> None:
+    """Drain INDEX_QUEUE_NAME in batches of INDEX_QUEUE_BATCH messages."""
+    if not INDEX_QUEUE_NAME:
+        return
+
+    queue = get_queue(INDEX_QUEUE_NAME)
+    deadline = time.monotonic() + INDEX_DRAIN_MAX_SECONDS
+
+    while time.monotonic() < deadline:
+        # Without messages_per_page the pager fetches one message per request
+        messages = list(queue.receive_messages(max_messages=INDEX_QUEUE_BATCH,
+                                               messages_per_page=INDEX_QUEUE_BATCH,
+                                               visibility_timeout=INDEX_QUEUE_VISIBILITY_TIMEOUT))
+        if not messages:
+            break
+
+        urls_by_message = {}
+        changes = {}
+        for message in messages:
+            try:
+                message_changes = blob_changes(_queue_events(message.content))
+            except ValueError as e:
+                logging.error(f"Unreadable index message {message.id}: {e}")
+                urls_by_message[message.id] = None
+                continue
+            urls_by_message[message.id] = list(message_changes)
+            # Messages arrive roughly in event order: a later event for a blob wins
+            for url, event_type in message_changes.items():
+                changes.pop(url, None)
+                changes[url] = event_type
+
+        results = index_batch(changes)
+
+        for message in messages:
+            urls = urls_by_message[message.id]
+            try:
+                if urls is not None and all(results[url] != FAILED for url in urls):
+                    queue.delete_message(message)
+                elif urls is None or message.dequeue_count >= MAX_DEQUEUE_COUNT:
+                    get_queue(f"{INDEX_QUEUE_NAME}-poison").send_message(message.content)
+                    queue.delete_message(message)
+                # Otherwise the message reappears after its visibility timeout and is retried
+            except AzureError as e:
+                # Lease lost or queue unavailable: the message reappears; indexing it again is a no-op
+                logging.error(f"Could not settle index message {message.id}: {e}")
+
+        logging.info(f"Drained {len(messages)} index messages ({len(results)} blobs).")
+
+
+@app.route(route="search", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def Search(req: func.HttpRequest) -> func.HttpResponse:
+    """Ranked full-text search over indexed blobs: GET /api/search?q=<terms>&top=<n>."""
+    query = req.params.get("q", "").strip()
+    if not query:
+        return func.HttpResponse("Query parameter q is required", status_code=400)
+    try:
+        top = max(1, min(SEARCH_MAX_RESULTS, int(req.params.get("top", "10"))))
+    except ValueError:
+        return func.HttpResponse("top must be an integer", status_code=400)
+
+    start = time.monotonic()
+    terms, results = search(query, top)
+    elapsed_ms = round((time.monotonic() - start) * 1000, 1)
+    logging.info(f"Search {terms}: {len(results)} results in {elapsed_ms} ms")
+    return func.HttpResponse(
+        json.dumps({"query": query, "terms": terms, "results": results, "elapsedMs": elapsed_ms}),
+        mimetype="application/json", status_code=200
+    )
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError
+from azure.cosmos import CosmosClient, PartitionKey, exceptions
+from azure.storage.blob import BlobServiceClient
+from azure.storage.queue import QueueClient
+
+# Clients shared by every invocation in this worker process, and the single
+# conditional write that stores an index document.
+
+# Text blobs are read in chunks of this size, so memory stays flat for large files
+DOWNLOAD_CHUNK_BYTES = int(os.environ.get("DOWNLOAD_CHUNK_BYTES", str(4 * 1024 * 1024)))
+# Cosmos accepts at most this many operations in one patch request
+MAX_PATCH_OPERATIONS = 10
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+DELETED = "deleted"
+
+_lock = threading.Lock()
+_blob_service = None
+_cosmos_client = None
+_containers = {}
+_queues = {}
+
+
+def get_blob_service():
+    global _blob_service
+    if _blob_service is None:
+        with _lock:
+            if _blob_service is None:
+                _blob_service = BlobServiceClient.from_connection_string(
+                    os.environ["BLOB_CONN_STR"],
+                    max_single_get_size=DOWNLOAD_CHUNK_BYTES,
+                    max_chunk_get_size=DOWNLOAD_CHUNK_BYTES
+                )
+    return _blob_service
+
+
+def get_cosmos_client():
+    """One CosmosClient, and so one connection pool, for every container in this process."""
+    global _cosmos_client
+    if _cosmos_client is None:
+        with _lock:
+            if _cosmos_client is None:
+                _cosmos_client = CosmosClient.from_connection_string(os.environ["COSMOS_CONN_STR"])
+    return _cosmos_client
+
+
+def _cosmos_container(name, partition_path, refresh):
+    container = _containers.get(name)
+    if container is None or refresh:
+        client = get_cosmos_client()
+        with _lock:
+            container = _containers.get(name)
+            if container is None or refresh:
+                database = client.create_database_if_not_exists(os.environ["COSMOS_DB"])
+                container = database.create_container_if_not_exists(
+                    id=name,
+                    partition_key=PartitionKey(path=partition_path)
+                )
+                _containers[name] = container
+                logging.info(f"Database and container {name} checked/created.")
+    return container
+
+
+def get_container(refresh=False):
+    """Cosmos container client; the database and container are created once per process."""
+    return _cosmos_container(os.environ["COSMOS_CONTAINER"], "/id", refresh)
+
+
+def get_terms_container(refresh=False):
+    """Term index container (COSMOS_TERMS_CONTAINER, default "Terms"), partitioned by /term."""
+    return _cosmos_container(os.environ.get("COSMOS_TERMS_CONTAINER", "Terms"), "/term", refresh)
+
+
+def get_queue(name):
+    """QueueClient on INDEX_QUEUE_CONN_STR (default BLOB_CONN_STR), created once per process."""
+    queue = _queues.get(name)
+    if queue is None:
+        with _lock:
+            queue = _queues.get(name)
+            if queue is None:
+                conn = os.environ.get("INDEX_QUEUE_CONN_STR") or os.environ["BLOB_CONN_STR"]
+                queue = QueueClient.from_connection_string(conn, name)
+                try:
+                    queue.create_queue()
+                except ResourceExistsError:
+                    pass
+                _queues[name] = queue
+    return queue
+
+
+def _set_operations(document):
+    return [{"op": "set", "path": f"/{key}", "value": value} for key, value in document.items() if key != "id"]
+
+
+def _update_if_changed(container, document):
+    """Overwrite the stored document unless it already has this blob ETag.
+
+    A document without an ETag (blobEtag null: its extraction failed) is
+    always overwritten, and only ever overwrites another such document.
+    """
+    etag = document["blobEtag"]
+    operations = _set_operations(document)
+    if len(operations) <= MAX_PATCH_OPERATIONS:
+        # The filter makes the patch a no-op (412) when the blob has not changed
+        if etag is None:
+            condition = "NOT IS_DEFINED(c.blobEtag) OR IS_NULL(c.blobEtag)"
+        else:
+            condition = f"NOT IS_DEFINED(c.blobEtag) OR IS_NULL(c.blobEtag) OR c.blobEtag != {json.dumps(etag)}"
+        container.patch_item(
+            item=document["id"], partition_key=document["id"], patch_operations=operations,
+            filter_predicate=f"FROM c WHERE {condition}"
+        )
+        return
+    # Too many fields for one patch: read + conditional replace
+    stored = container.read_item(item=document["id"], partition_key=document["id"])
+    if stored.get("blobEtag") == etag or (etag is None and stored.get("blobEtag") is not None):
+        raise exceptions.CosmosAccessConditionFailedError(message="blob unchanged")
+    container.replace_item(item=document["id"], body=document, etag=stored["_etag"],
+                           match_condition=MatchConditions.IfNotModified)
+
+
+def read_document(doc_id):
+    """The stored index document, or None if the blob has not been indexed."""
+    try:
+        return get_container().read_item(item=doc_id, partition_key=doc_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def save_document(document):
+    """Create the index document; on a conflict, overwrite it only when the blob's
+    ETag has changed. Returns CREATED, UPDATED or UNCHANGED."""
+    for attempt in (1, 2):
+        container = get_container(refresh=attempt == 2)
+        try:
+            container.create_item(document)
+            return CREATED
+        except exceptions.CosmosResourceExistsError:
+            try:
+                _update_if_changed(container, document)
+                return UPDATED
+            except exceptions.CosmosAccessConditionFailedError:
+                return UNCHANGED
+        except exceptions.CosmosResourceNotFoundError:
+            # Database or container deleted since it was provisioned: provision again
+            if attempt == 2:
+                raise
+            logging.warning("Cosmos container missing; provisioning again.")
+
+
+def delete_document(doc_id):
+    """Delete the index document for a removed blob. Returns DELETED, or None if there was none."""
+    try:
+        get_container().delete_item(item=doc_id, partition_key=doc_id)
+        return DELETED
+    except exceptions.CosmosResourceNotFoundError:
+        return None
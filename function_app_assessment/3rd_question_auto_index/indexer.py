@@ -0,0 +1,187 @@
+import base64
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from index_store import UNCHANGED, delete_document, get_blob_service, read_document, save_document
+from term_index import remove_terms, update_terms
+from extraction import extract
+from extractors import find_extractor
+
+# Per-blob indexing (properties -> change check -> content extraction -> term
+# index -> Cosmos write), used one event at a time by EventGridTrigger and for
+# whole batches by EventGridBatch and IndexQueueDrain.
+
+# Blobs indexed at the same time within a batch (download + parse + write); large
+# and heavy documents are parsed in extraction's process pool
+INDEX_MAX_WORKERS = int(os.environ.get("INDEX_MAX_WORKERS", "16"))
+BLOB_CREATED = "Microsoft.Storage.BlobCreated"
+BLOB_DELETED = "Microsoft.Storage.BlobDeleted"
+
+index_pool = ThreadPoolExecutor(max_workers=INDEX_MAX_WORKERS)
+
+FAILED = "failed"
+
+
+def split_blob_url(blob_url):
+    """(container, blob name) from https://<account>.blob.core.windows.net/<container>/<blob>."""
+    parts = blob_url.replace("https://", "").split("/", 2)
+    return parts[1], parts[2]
+
+
+def content_hash(props):
+    """Hash of the blob's content as reported by its properties, or None.
+
+    Storage keeps a Content-MD5 for blobs uploaded in one request (and for
+    block lists whose uploader sent one); uploads from the resize app carry
+    a SHA-256 in their "contenthash" metadata instead.
+    """
+    md5 = props.content_settings.content_md5
+    if md5:
+        return "md5:" + base64.b64encode(bytes(md5)).decode("ascii")
+    sha256 = (props.metadata or {}).get("contenthash")
+    return f"sha256:{sha256}" if sha256 else None
+
+
+def build_document(blob_url, props, stored=None):
+    """Index document for a blob: its properties and, for a format with an
+    extractor (extractors.py), its title, word count and terms. Returns
+    (document, {term: frequency}, number of terms).
+
+    With stored (the document of a blob with the same content hash) the
+    content fields are copied from it and nothing is downloaded; the terms
+    are then None, as the term index already holds them. They are None too
+    when extraction fails, and the document then has no blobEtag, so the
+    next event for the blob is not taken for an unchanged one.
+    """
+    container_name, blob_name = split_blob_url(blob_url)
+    logging.info(f"Container: {container_name}, Blob: {blob_name}")
+
+    size = props.size
+    content_type = props.content_settings.content_type
+    blob_hash = content_hash(props)
+    blob_etag = props.etag
+    extractor = find_extractor(blob_name, content_type)
+
+    #  READ BLOB
+
+    title = None
+    word_count = None
+    terms = {}
+    term_count = 0
+
+    if stored is not None:
+        logging.info("Blob content unchanged. Skipping content extraction.")
+        title, word_count = stored.get("title"), stored.get("wordCount")
+        terms, term_count = None, None
+    elif extractor:
+        try:
+            # Single pass over the downloaded chunks, inline or in a worker process
+            title, word_count, terms, term_count = extract(container_name, blob_name, extractor, size)
+
+        except Exception as e:
+            logging.error(f"Error reading blob content: {e}")
+            title = None
+            word_count = None
+            # Terms stay as they were; no ETag or hash is recorded, so the next
+            # event for this blob extracts again
+            terms, term_count = None, None
+            blob_hash = None
+            blob_etag = None
+    else:
+        logging.info("No extractor for this content type. Skipping content extraction.")
+
+    return {
+        "id": blob_name,
+        "blobName": blob_name,
+        "container": container_name,
+        "url": blob_url,
+        "size": size,
+        "contentType": content_type,
+        "title": title,
+        "wordCount": word_count,
+        "blobEtag": blob_etag,
+        "contentHash": blob_hash,
+        "uploadedOn": datetime.utcnow().isoformat()
+    }, terms, term_count
+
+
+def index_blob(blob_url):
+    """Index one blob. Returns the save_document result.
+
+    The blob's properties are compared with the stored document first: the
+    same ETag costs that one metadata call (plus a Cosmos point read), and the
+    same content hash under a new ETag only refreshes the document's metadata.
+    """
+    container_name, blob_name = split_blob_url(blob_url)
+    blob_client = get_blob_service().get_blob_client(container=container_name, blob=blob_name)
+
+    # Blob properties
+    props = blob_client.get_blob_properties()
+
+    stored = read_document(blob_name)
+    if stored and stored.get("blobEtag") == props.etag:
+        logging.info(f"Cosmos document {blob_name}: {UNCHANGED} (same ETag).")
+        return UNCHANGED
+    blob_hash = content_hash(props)
+    same_content = stored is not None and blob_hash is not None and stored.get("contentHash") == blob_hash
+
+    document, terms, term_count = build_document(blob_url, props, stored if same_content else None)
+    logging.info(f"Document to insert: {document}")
+
+    # Terms first: a failure here leaves the document unwritten, so the retry redoes both
+    if terms is not None:
+        update_terms(blob_name, document["contentHash"] or document["blobEtag"], terms, term_count)
+
+    # One conditional write: create, or overwrite only if the blob's ETag changed
+    result = save_document(document)
+    logging.info(f"Cosmos document {document['id']}: {result}.")
+    return result
+
+
+def remove_blob(blob_url):
+    """Drop a deleted blob from the term index and Cosmos. Returns "deleted" or None."""
+    _, blob_name = split_blob_url(blob_url)
+    remove_terms(blob_name)
+    result = delete_document(blob_name)
+    logging.info(f"Cosmos document {blob_name}: {result or 'not indexed'}.")
+    return result
+
+
+def apply_event(event_type, blob_url):
+    if event_type == BLOB_DELETED:
+        return remove_blob(blob_url)
+    return index_blob(blob_url)
+
+
+def blob_changes(events):
+    """{blob url: event type} for the BlobCreated/BlobDeleted events in an Event
+    Grid batch (event grid or cloud event schema). Repeated events for a blob
+    collapse into the last one. Anything that is not an event object is skipped."""
+    changes = {}
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        event_type = event.get("eventType") or event.get("type")
+        data = event.get("data")
+        url = data.get("url") if isinstance(data, dict) else None
+        if event_type in (BLOB_CREATED, BLOB_DELETED) and isinstance(url, str) and url:
+            changes.pop(url, None)
+            changes[url] = event_type
+    return changes
+
+
+def _apply_one(change):
+    blob_url, event_type = change
+    try:
+        return apply_event(event_type, blob_url)
+    except Exception as e:
+        logging.error(f"Indexing {blob_url} failed: {e}")
+        return FAILED
+
+
+def index_batch(changes):
+    """Apply blob changes ({url: event type}) concurrently on the shared pool.
+    Returns {url: result}, where a result is created/updated/unchanged/deleted,
+    None for a removed blob that was never indexed, or "failed"."""
+    return dict(zip(changes, index_pool.map(_apply_one, changes.items())))
@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from index_store import get_container, get_terms_container
+from text_stats import terms_of
+
+# Inverted term index in the Terms container, partitioned by /term so every
+# term lookup is a single-partition query. Documents per term partition:
+#   posting  id=sha1(blobId)  {term, blobId, tf, len, ntf}   ntf = tf / len
+#   stats    id="_stats"      {term, df}
+# plus one "#corpus" partition with {docs, totalLength} for BM25 (and one
+# {length} member per blob, id=sha1(blobId)) and one "#blob:<blobId>"
+# partition per blob with the terms it was indexed under, so a re-index
+# writes only the difference and a removal knows what to delete.
+
+# Terms kept per blob (most frequent first); the document length counts all terms
+INDEX_MAX_TERMS = int(os.environ.get("INDEX_MAX_TERMS", "200"))
+# Parallel posting writes for one blob
+TERM_WRITE_WORKERS = int(os.environ.get("TERM_WRITE_WORKERS", "16"))
+# Postings read per query term, highest ntf first
+SEARCH_CANDIDATES_PER_TERM = int(os.environ.get("SEARCH_CANDIDATES_PER_TERM", "200"))
+MAX_QUERY_TERMS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# "#" never occurs in a term, so these partitions cannot collide with one
+STATS_ID = "_stats"
+STATE_ID = "_state"
+CORPUS = "#corpus"
+
+posting_pool = ThreadPoolExecutor(max_workers=TERM_WRITE_WORKERS)
+
+
+def _state_partition(blob_id):
+    return f"#blob:{blob_id}"
+
+
+def _posting_id(blob_id):
+    # Blob names may contain characters Cosmos does not allow in ids ("/", "?", "#")
+    return hashlib.sha1(blob_id.encode("utf-8")).hexdigest()
+
+
+def _read(container, item, partition):
+    try:
+        return container.read_item(item=item, partition_key=partition)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def _counted(container, partition, operation, fields):
+    """Run one batch operation together with the matching change to the
+    partition's _stats counters ({name: delta}), in one transactional batch,
+    so the counters always match the documents they count. Returns False,
+    changing nothing, when the operation's own precondition fails (document
+    already created, already deleted, or changed since it was read).
+    """
+    increments = [{"op": "incr", "path": f"/{name}", "value": delta} for name, delta in fields.items() if delta]
+    for _ in range(3):
+        try:
+            container.execute_item_batch([operation] + ([("patch", (STATS_ID, increments))] if increments else []),
+                                         partition_key=partition)
+            return True
+        except exceptions.CosmosBatchOperationError as e:
+            if e.error_index == 0 and e.status_code in (404, 409, 412):
+                return False
+            if e.status_code != 404:
+                raise
+        # No _stats document yet: create it with the operation
+        try:
+            container.execute_item_batch([operation, ("create", ({"id": STATS_ID, "term": partition, **fields},))],
+                                         partition_key=partition)
+            return True
+        except exceptions.CosmosBatchOperationError as e:
+            if e.error_index == 0 and e.status_code in (404, 409, 412):
+                return False
+            if e.status_code != 409:
+                raise
+            # Created by a concurrent writer in the meantime: patch it
+    raise RuntimeError(f"Could not update term statistics for {partition}")
+
+
+def _write_posting(container, blob_id, term, tf, length):
+    """Refresh or create a posting; df counts it once, whatever the number of attempts."""
+    posting = {
+        "id": _posting_id(blob_id), "term": term, "blobId": blob_id,
+        "tf": tf, "len": length, "ntf": tf / length
+    }
+    operations = [{"op": "set", "path": f"/{name}", "value": posting[name]} for name in ("tf", "len", "ntf")]
+    while True:
+        try:
+            container.patch_item(item=posting["id"], partition_key=term, patch_operations=operations)
+            return term
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+        if _counted(container, term, ("create", (posting,)), {"df": 1}):
+            return term
+        # Created by a concurrent update of the same blob: patch it
+
+
+def _delete_posting(container, blob_id, term):
+    _counted(container, term, ("delete", (_posting_id(blob_id),)), {"df": -1})
+    return term
+
+
+def _set_corpus_length(container, blob_id, length):
+    """Record the blob's length in the #corpus counters (None: not counted).
+
+    A per-blob member document in the #corpus partition holds the length
+    counted for the blob, so the deltas come from it and a retry adds nothing.
+    """
+    member_id = _posting_id(blob_id)
+    while True:
+        member = _read(container, member_id, CORPUS)
+        if member is None and length is None:
+            return
+        if member is None:
+            operation = ("create", ({"id": member_id, "term": CORPUS, "length": length},))
+            fields = {"docs": 1, "totalLength": length}
+        elif length is None:
+            operation = ("delete", (member_id,), {"if_match_etag": member["_etag"]})
+            fields = {"docs": -1, "totalLength": -member["length"]}
+        elif length == member["length"]:
+            return
+        else:
+            operation = ("replace", (member_id, {"id": member_id, "term": CORPUS, "length": length}),
+                         {"if_match_etag": member["_etag"]})
+            fields = {"totalLength": length - member["length"]}
+        if _counted(container, CORPUS, operation, fields):
+            return
+        # Changed by a concurrent update of the same blob: read it again
+
+
+def _finish(container, partition, state):
+    """Clear the pending marker of a state written by update_terms, or drop
+    the state of a blob without terms. None when done, else the state that
+    replaced it in the meantime ({} if there is none)."""
+    try:
+        if state["terms"]:
+            body = {name: value for name, value in state.items() if name != "pending" and not name.startswith("_")}
+            container.replace_item(item=STATE_ID, body=body, etag=state["_etag"],
+                                   match_condition=MatchConditions.IfNotModified)
+        else:
+            container.delete_item(item=STATE_ID, partition_key=partition, etag=state["_etag"],
+                                  match_condition=MatchConditions.IfNotModified)
+        return None
+    except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+        return _read(container, STATE_ID, partition) or {}
+
+
+def update_terms(blob_id, content_key, counts, length):
+    """Bring the postings of one blob in line with its new term counts.
+
+    counts is {term: frequency} (empty for a blob without text) and length its
+    total number of terms. content_key identifies the content (hash, or ETag
+    when there is none); content already indexed under it costs one read.
+
+    Safe to retry and to run concurrently for the same blob. Every df and
+    corpus change is made in the same transactional batch as the posting (or
+    corpus member) it counts, so no attempt can count a blob twice. The
+    per-blob state is written first, guarded by its _etag, with a pending
+    list of the terms whose postings have to go, and is cleared once the
+    postings are written; an interrupted update is redone in full.
+    """
+    container = get_terms_container()
+    counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:INDEX_MAX_TERMS])
+    partition = _state_partition(blob_id)
+    orphans, redo = [], False
+    while True:
+        state = _read(container, STATE_ID, partition)
+        if not redo:
+            if state and state.get("contentKey") == content_key and "pending" not in state:
+                return
+            if not state and not counts:
+                return
+        stale = set((state or {}).get("terms", {})) | set((state or {}).get("pending", [])) | set(orphans)
+        written = {"id": STATE_ID, "term": partition, "contentKey": content_key, "terms": counts,
+                   "length": length, "pending": sorted(stale - set(counts))}
+        try:
+            if state is None:
+                written = container.create_item(written)
+            else:
+                written = container.replace_item(item=STATE_ID, body=written, etag=state["_etag"],
+                                                 match_condition=MatchConditions.IfNotModified)
+        except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError,
+                exceptions.CosmosResourceNotFoundError):
+            # A concurrent update of this blob wrote (or removed) its state first: start from it
+            continue
+
+        writes = [posting_pool.submit(_write_posting, container, blob_id, term, tf, length) for term, tf in counts.items()]
+        writes += [posting_pool.submit(_delete_posting, container, blob_id, term) for term in written["pending"]]
+        for future in writes:
+            future.result()
+        _set_corpus_length(container, blob_id, length if counts else None)
+
+        current = _finish(container, partition, written)
+        if current is None:
+            logging.info(f"Term index for {blob_id}: {len(counts)} terms, {len(written['pending'])} removed.")
+            return
+        # Another update of this blob got in between. Postings written here for
+        # terms it does not have must go: hand them over while it is running,
+        # otherwise redo the update for its content with them.
+        orphans = [term for term in counts if term not in current.get("terms", {})]
+        if "pending" in current and current["contentKey"] != content_key:
+            current["pending"] = sorted(set(current["pending"]) | set(orphans))
+            try:
+                container.replace_item(item=STATE_ID, body=current, etag=current["_etag"],
+                                       match_condition=MatchConditions.IfNotModified)
+                return
+            except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+                current = _read(container, STATE_ID, partition) or {}
+                orphans = [term for term in counts if term not in current.get("terms", {})]
+        content_key, counts, length = current.get("contentKey"), current.get("terms", {}), current.get("length", 0)
+        redo = True
+
+
+def remove_terms(blob_id):
+    """Drop every posting of a deleted blob."""
+    update_terms(blob_id, None, {}, 0)
+
+
+def _candidates(container, term):
+    stats = _read(container, STATS_ID, term)
+    if not stats or stats.get("df", 0) <= 0:
+        return term, 0, []
+    postings = container.query_items(
+        query="SELECT TOP @n c.blobId, c.tf, c.len FROM c WHERE IS_DEFINED(c.blobId) ORDER BY c.ntf DESC",
+        parameters=[{"name": "@n", "value": SEARCH_CANDIDATES_PER_TERM}],
+        partition_key=term
+    )
+    return term, stats["df"], list(postings)
+
+
+def _describe(blob_id, score):
+    document = _read(get_container(), blob_id, blob_id) or {}
+    return {"id": blob_id, "title": document.get("title"), "url": document.get("url"), "score": round(score, 4)}
+
+
+def search(query, top=10):
+    """BM25-ranked blobs for a free-text query.
+
+    Each query term is one point read (df) and one single-partition TOP query
+    over its highest-ntf postings, so the cost depends on the number of query
+    terms, not on the corpus size. Blobs outside every term's candidate list
+    are not scored: the ranking is approximate for very common terms.
+    """
+    terms = list(dict.fromkeys(terms_of(query)))[:MAX_QUERY_TERMS]
+    container = get_terms_container()
+    corpus = _read(container, STATS_ID, CORPUS) or {}
+    docs = corpus.get("docs", 0)
+    if not terms or docs <= 0:
+        return terms, []
+    avg_length = corpus.get("totalLength", 0) / docs or 1
+
+    scores = {}
+    for term, df, postings in posting_pool.map(lambda term: _candidates(container, term), terms):
+        idf = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+        for posting in postings:
+            tf = posting["tf"]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * posting["len"] / avg_length)
+            scores[posting["blobId"]] = scores.get(posting["blobId"], 0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:top]
+    return terms, list(posting_pool.map(lambda item: _describe(*item), ranked))
@@ -0,0 +1,171 @@
+import codecs
+import os
+import re
+from collections import Counter
+
+# Streaming title + word count for text blobs. Chunks are fed as they are
+# downloaded; only the current partial line (capped) and a few flags are kept,
+# so memory stays bounded no matter how large the blob is.
+#
+# Same results as the original whole-text version:
+#   title      first line that starts with "# " (after strip), else the first
+#              line, else "(empty file)"
+#   wordCount  len(text.split())
+#
+# With count_terms=True it also collects term frequencies for term_index.
+
+# Title search stops after this many lines; the word count always covers the whole blob
+TITLE_SCAN_MAX_LINES = int(os.environ.get("TITLE_SCAN_MAX_LINES", "1000"))
+# Longest line kept for the title; the rest of a longer line is ignored
+MAX_LINE_CHARS = 4096
+EMPTY_TITLE = "(empty file)"
+
+# Terms: lower-cased runs of MIN..MAX_TERM_CHARS letters/digits, minus stop words
+MIN_TERM_CHARS = 2
+MAX_TERM_CHARS = 40
+TERM = re.compile(rf"\b\w{{{MIN_TERM_CHARS},{MAX_TERM_CHARS}}}\b")
+# Distinct terms tracked per blob; beyond this the rarest are dropped so memory stays bounded
+MAX_DISTINCT_TERMS = int(os.environ.get("MAX_DISTINCT_TERMS", "50000"))
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is it its me my no not "
+    "of on or our she so than that the their them then there these they this to too us was we were "
+    "what when which who will with you your".split()
+)
+
+
+def terms_of(text):
+    """Index terms in text, in order (used for queries and by TermCounter)."""
+    return [term for term in TERM.findall(text.lower()) if term not in STOP_WORDS]
+
+
+class TermCounter:
+    """Streaming term frequencies; a term cut by a chunk boundary is held back
+    until the next chunk completes it."""
+
+    def __init__(self, max_distinct=MAX_DISTINCT_TERMS):
+        self.counts = Counter()
+        self.length = 0
+        self._max_distinct = max_distinct
+        self._carry = ""
+
+    def feed(self, text):
+        # Lower-cased before the boundary check: lower() can change the length of a token
+        text = self._carry + text.lower()
+        # A token touching the end of the text may continue in the next chunk
+        # (isalnum() or "_" is exactly what \w matches)
+        start = len(text)
+        while start and (text[start - 1].isalnum() or text[start - 1] == "_"):
+            start -= 1
+        self._carry = text[start:][:MAX_TERM_CHARS + 1]
+        self._add(text[:start])
+
+    def finish(self):
+        self._add(self._carry)
+        self._carry = ""
+        # Stop words are counted like any term (in C) and dropped once here
+        for word in STOP_WORDS.intersection(self.counts):
+            self.length -= self.counts.pop(word)
+
+    def _add(self, text):
+        tokens = TERM.findall(text)
+        self.length += len(tokens)
+        self.counts.update(tokens)
+        if len(self.counts) > 2 * self._max_distinct:
+            # Keep the most frequent half; a dropped term restarts from zero if it comes back
+            self.counts = Counter(dict(self.counts.most_common(self._max_distinct)))
+
+    def top(self, n):
+        """{term: frequency} for the n most frequent terms."""
+        return dict(self.counts.most_common(n))
+
+
+class TextStats:
+    """Usage:
+        stats = TextStats()
+        for chunk in downloader.chunks():
+            stats.feed(chunk)
+        title, word_count = stats.finish()
+        stats.terms.top(200)                    # with count_terms=True
+    """
+
+    def __init__(self, title_scan_max_lines=TITLE_SCAN_MAX_LINES, count_terms=False):
+        # Multi-byte sequences split across chunks are held back until complete
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._max_lines = title_scan_max_lines
+        self._line = ""
+        self._lines_seen = 0
+        self._skip_lf = False
+        self._scanning = True
+        self._first_line = None
+        self._heading = None
+        self._in_word = False
+        self.word_count = 0
+        self.terms = TermCounter() if count_terms else None
+
+    def feed(self, chunk):
+        self._consume(self._decoder.decode(chunk))
+
+    def feed_text(self, text):
+        """Feed already decoded text (extractors that parse the bytes themselves)."""
+        self._consume(text)
+
+    def finish(self):
+        """Flush the decoder and return (title, word_count)."""
+        self._consume(self._decoder.decode(b"", final=True))
+        if self.terms is not None:
+            self.terms.finish()
+        if self._scanning and self._line:
+            self._end_line(self._line)
+        return self._heading or self._first_line or EMPTY_TITLE, self.word_count
+
+    def _consume(self, text):
+        if not text:
+            return
+        self._count_words(text)
+        if self.terms is not None:
+            self.terms.feed(text)
+        if self._scanning:
+            self._scan_lines(text)
+
+    def _count_words(self, text):
+        words = len(text.split())
+        # A word cut by the chunk boundary was counted in both chunks
+        if self._in_word and not text[0].isspace():
+            words -= 1
+        self.word_count += words
+        self._in_word = not text[-1].isspace()
+
+    def _append(self, text):
+        if len(self._line) < MAX_LINE_CHARS:
+            self._line += text[:MAX_LINE_CHARS - len(self._line)]
+
+    def _scan_lines(self, text):
+        if self._skip_lf:
+            # "\r\n" split across chunks: the "\r" already ended the line
+            self._skip_lf = False
+            text = text[1:] if text.startswith("\n") else text
+        for part in text.splitlines(keepends=True):
+            body = part.splitlines()[0]
+            if body == part:
+                # No line break: a partial line that continues in the next chunk
+                self._append(body)
+                self._skip_lf = False
+                return
+            self._append(body)
+            line, self._line = self._line, ""
+            self._skip_lf = part.endswith("\r")
+            self._end_line(line)
+            if not self._scanning:
+                return
+
+    def _end_line(self, line):
+        stripped = line.strip()
+        if self._first_line is None:
+            self._first_line = stripped
+        if stripped.startswith("# "):
+            self._heading = stripped[2:].strip()
+            self._scanning = False
+            return
+        self._lines_seen += 1
+        if self._lines_seen >= self._max_lines:
+            self._scanning = False
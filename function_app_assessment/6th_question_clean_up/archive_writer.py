@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from azure.storage.blob import ContentSettings
+
+# Streams NDJSON rows through a compressor straight into a block blob. Only
+# the block being filled and the one being uploaded are held in memory; no
+# local file is written. The previous block uploads while the next one is
+# being filled from the SQL cursor.
+
+# "zstd" needs the optional zstandard package; "auto" uses it when installed, else gzip
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "auto")
+ARCHIVE_COMPRESSION_LEVEL = os.getenv("ARCHIVE_COMPRESSION_LEVEL")
+# Compressed bytes per staged block
+ARCHIVE_BLOCK_BYTES = int(os.getenv("ARCHIVE_BLOCK_BYTES", str(4 * 1024 * 1024)))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _Gzip:
+    name = "gzip"
+    extension = ".gz"
+    content_type = "application/gzip"
+
+    def __init__(self, level):
+        # wbits=31: gzip container, readable with gunzip / gzip.open
+        self._compressor = zlib.compressobj(int(level or 6), zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class _Zstd:
+    name = "zstd"
+    extension = ".zst"
+    content_type = "application/zstd"
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=int(level or 3)).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def compression_codec(name=ARCHIVE_COMPRESSION):
+    """Compressor class for "gzip", "zstd" or "auto"."""
+    if name == "zstd" or (name == "auto" and zstandard is not None):
+        if zstandard is None:
+            raise RuntimeError("ARCHIVE_COMPRESSION=zstd needs the zstandard package")
+        return _Zstd
+    if name in ("gzip", "auto"):
+        return _Gzip
+    raise ValueError(f"Unknown ARCHIVE_COMPRESSION: {name}")
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class ArchiveWriter:
+    """Usage:
+        writer = ArchiveWriter(container_client, "orders/.../orders-<run>-00001.ndjson")
+        for row in rows:
+            writer.write(row)
+        manifest = writer.close()   # commits the blob and writes <blob>.manifest.json
+    """
+
+    def __init__(self, container_client, base_path, codec=None, level=ARCHIVE_COMPRESSION_LEVEL,
+                 block_bytes=ARCHIVE_BLOCK_BYTES):
+        codec = codec or compression_codec()
+        self.blob_path = base_path + codec.extension
+        self._container = container_client
+        self._blob = container_client.get_blob_client(self.blob_path)
+        self._codec = codec
+        self._compressor = codec(level)
+        self._block_bytes = block_bytes
+        self._pending = bytearray()
+        self._block_ids = []
+        self._upload = None
+        self._uploader = ThreadPoolExecutor(max_workers=1)
+        self._sha256 = hashlib.sha256()
+        self.rows = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def write(self, row):
+        line = (json.dumps(row, default=_json_value) + "\n").encode("utf-8")
+        self.rows += 1
+        self.raw_bytes += len(line)
+        self._add(self._compressor.compress(line))
+
+    def _add(self, data):
+        self._pending += data
+        if len(self._pending) >= self._block_bytes:
+            self._stage(bytes(self._pending))
+            self._pending.clear()
+
+    def _stage(self, block):
+        self._sha256.update(block)
+        self.compressed_bytes += len(block)
+        block_id = base64.b64encode(f"{len(self._block_ids):08d}".encode()).decode()
+        self._block_ids.append(block_id)
+        # One upload in flight: wait for the previous block before handing over the next
+        if self._upload is not None:
+            self._upload.result()
+        self._upload = self._uploader.submit(self._blob.stage_block, block_id, block)
+
+    def close(self):
+        """Flush the compressor, commit the blob and write its manifest. Returns the manifest."""
+        try:
+            self._add(self._compressor.flush())
+            if self._pending:
+                self._stage(bytes(self._pending))
+                self._pending.clear()
+            if self._upload is not None:
+                self._upload.result()
+        finally:
+            self._uploader.shutdown(wait=True)
+
+        sha256 = self._sha256.hexdigest()
+        self._blob.commit_block_list(
+            self._block_ids,
+            content_settings=ContentSettings(content_type=self._codec.content_type),
+            metadata={"rows": str(self.rows), "sha256": sha256, "format": "ndjson"}
+        )
+        manifest = {
+            "blob": self.blob_path,
+            "format": "ndjson",
+            "compression": self._codec.name,
+            "rows": self.rows,
+            "uncompressedBytes": self.raw_bytes,
+            "compressedBytes": self.compressed_bytes,
+            # Of the blob as stored (compressed bytes)
+            "sha256": sha256,
+            "createdOn": datetime.now(timezone.utc).isoformat(),
+        }
+        self._container.get_blob_client(self.blob_path + ".manifest.json").upload_blob(
+            json.dumps(manifest, indent=2), overwrite=True,
+            content_settings=ContentSettings(content_type="application/json")
+        )
+        return manifest
+
+    def abort(self):
+        """Drop the staged blocks (uncommitted blocks are discarded by the service)."""
+        self._uploader.shutdown(wait=True, cancel_futures=True)
@@ -1,12 +1,11 @@
 # TimerCleanupFunction
 import logging
 import os
-import json
 from datetime import datetime, timezone
-import tempfile
 
 import azure.functions as func
 from azure.storage.blob import BlobServiceClient
+from archive_writer import ArchiveWriter, compression_codec
 
 # Config
 SQL_CONN_STR = os.getenv("SQL_CONN_STR")
@@ -14,6 +13,8 @@ BLOB_CONN_STR = os.getenv("AzureWebJobsStorage")
 ARCHIVE_CONTAINER = os.getenv("ARCHIVE_CONTAINER", "archive")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1000"))
 DAYS_OLD = int(os.getenv("DAYS_OLD", "30"))
+# Rows pulled from the cursor per round trip while a batch streams to blob
+FETCH_ROWS = int(os.getenv("FETCH_ROWS", "500"))
 
 # SQL templates
 SELECT_BATCH_SQL = """
@@ -24,10 +25,15 @@ ORDER BY createdOn ASC;
 """
 
 def fetch_batch(cursor, limit, days_old):
+    """Rows of one batch as dicts, read from the cursor FETCH_ROWS at a time."""
     cursor.execute(SELECT_BATCH_SQL, (limit, days_old))
     cols = [c[0] for c in cursor.description]
-    rows = cursor.fetchall()
-    return [dict(zip(cols, r)) for r in rows]
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        for r in rows:
+            yield dict(zip(cols, r))
 
 def chunked(iterable, size):
     for i in range(0, len(iterable), size):
@@ -52,6 +58,7 @@ def main(mytimer: func.TimerRequest) -> None:
         pass  # container already exists
 
     total_archived = 0
+    total_bytes = 0
     start_time = datetime.now(timezone.utc)
 
 
@@ -83,43 +90,40 @@ def main(mytimer: func.TimerRequest) -> None:
     cursor = cnxn.cursor()
 
     try:
+        codec = compression_codec()
+        batch_number = 0
 
         while True:
-            rows = fetch_batch(cursor, BATCH_SIZE, DAYS_OLD)
-            if not rows:
-                break
-
-            # NDJSON
-            ndjson_lines = []
-            ids = []
-            for r in rows:
-                if isinstance(r.get("createdOn"), datetime):
-                    r["createdOn"] = r["createdOn"].isoformat()
-                if isinstance(r.get("updatedOn"), datetime) and r.get("updatedOn"):
-                    r["updatedOn"] = r["updatedOn"].isoformat()
-
-                ndjson_lines.append(json.dumps(r, default=str))
-                ids.append(r["id"])
-
-            # NDJSON to temp file
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            batch_number += 1
+            # One blob per batch; the batch number keeps batches of the same second apart
             blob_path = (
                 f"orders/{utc_now.year}/{utc_now.month:02d}/{utc_now.day:02d}/"
-                f"orders-{timestamp}.ndjson"
+                f"orders-{run_id}-{batch_number:05d}.ndjson"
             )
 
-            with tempfile.NamedTemporaryFile(mode="w+", delete=False, encoding="utf-8") as tmpf:
-                for line in ndjson_lines:
-                    tmpf.write(line + "\n")
-                tmpf.flush()
-                tmp_name = tmpf.name
-
-            # Upload to blob
-            blob_client = container_client.get_blob_client(blob_path)
-            with open(tmp_name, "rb") as data:
-                blob_client.upload_blob(data, overwrite=True)
+            # NDJSON rows go from the cursor through the compressor into staged blocks
+            writer = None
+            ids = []
+            try:
+                for r in fetch_batch(cursor, BATCH_SIZE, DAYS_OLD):
+                    if writer is None:
+                        writer = ArchiveWriter(container_client, blob_path, codec)
+                    writer.write(r)
+                    ids.append(r["id"])
+                if writer is None:
+                    break
+                manifest = writer.close()
+            except Exception:
+                if writer is not None:
+                    writer.abort()
+                raise
 
-            logging.info(f"Uploaded archive blob: {blob_client.url} ({len(ndjson_lines)} rows)")
+            total_bytes += manifest["compressedBytes"]
+            logging.info(
+                f"Uploaded archive blob: {manifest['blob']} ({manifest['rows']} rows, "
+                f"{manifest['uncompressedBytes']} -> {manifest['compressedBytes']} bytes {codec.name}, "
+                f"sha256={manifest['sha256']})"
+            )
 
             # Delete archived in db
             try:
@@ -138,7 +142,7 @@ def main(mytimer: func.TimerRequest) -> None:
                 raise
 
         duration = (datetime.now(timezone.utc) - start_time).total_seconds()
-        logging.info(f"Finished. Total archived: {total_archived} rows in {duration:.1f}s run_id={run_id}")
+        logging.info(f"Finished. Total archived: {total_archived} rows ({total_bytes} bytes) in {duration:.1f}s run_id={run_id}")
 
     except Exception as err:
         logging.exception(f"TimerCleanupFunction failed: {err}")